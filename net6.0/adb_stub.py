@@ -0,0 +1,232 @@
+"""Stand-in for the adb server, to exercise DeviceWatcher without a tablet attached.
+
+Speaks the parts of the host protocol the watcher uses: `host:track-devices` (the device list is
+pushed to every tracker on each change) and `host:transport:<serial>` followed by the boot-wait
+`shell:` command, which answers "booted" once the fake device has finished booting, or by a bare
+`shell:` for AdbShell: an interactive shell that echoes each line like a pty and knows `echo`,
+`getprop ro.serialno` and `id`. Devices are driven from the test side with `attach()`,
+`detach()`, `boot()` and `reboot()`.
+
+`python adb_stub.py` runs the DeviceWatcher and AdbShell checks (connect, disconnect, reboot,
+boot completed, shell output) against a stub on a free local port and exits non-zero if one
+fails.
+"""
+import logging
+import shlex
+import socket
+import sys
+import threading
+import time
+
+from device_watcher import BOOT_WAIT_COMMAND, AdbShell, DeviceWatcher, recv_exact
+
+
+class FakeAdbServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.listener = socket.create_server((host, port))
+        self.host, self.port = self.listener.getsockname()[:2]
+        self.condition = threading.Condition()
+        self.states = {}
+        self.booted = set()
+        self.trackers = []
+        self.running = True
+        threading.Thread(target=self.serve, name="adb-stub", daemon=True).start()
+
+    def close(self):
+        self.running = False
+        self.listener.close()
+        with self.condition:
+            for tracker in self.trackers:
+                tracker.close()
+            self.trackers.clear()
+            self.condition.notify_all()
+
+    def serve(self):
+        while self.running:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+    @staticmethod
+    def read_request(sock):
+        length = int(recv_exact(sock, 4), 16)
+        return recv_exact(sock, length).decode('utf-8')
+
+    @staticmethod
+    def fail(sock, message):
+        payload = message.encode('utf-8')
+        sock.sendall(b'FAIL' + b'%04x' % len(payload) + payload)
+        sock.close()
+
+    def handle(self, sock):
+        try:
+            request = self.read_request(sock)
+            if request == "host:track-devices":
+                sock.sendall(b'OKAY')
+                with self.condition:
+                    self.trackers.append(sock)
+                    self.push(sock)
+                return
+            if not request.startswith("host:transport"):
+                return self.fail(sock, f"unsupported request {request}")
+            serial = request.split(':', 2)[2] if request.startswith("host:transport:") else None
+            with self.condition:
+                serial = serial or next(iter(self.states), None)
+                if self.states.get(serial) != 'device':
+                    return self.fail(sock, f"device '{serial}' not found")
+            sock.sendall(b'OKAY')
+            command = self.read_request(sock)
+            if command == "shell:":
+                sock.sendall(b'OKAY')
+                return self.interactive_shell(sock, serial)
+            if command != f"shell:{BOOT_WAIT_COMMAND}":
+                return self.fail(sock, f"unsupported command {command}")
+            sock.sendall(b'OKAY')
+            with self.condition:
+                # Like the real command, the wait ends without output when the device goes away.
+                self.condition.wait_for(lambda: not self.running or serial in self.booted
+                                        or self.states.get(serial) != 'device')
+                booted = serial in self.booted and self.states.get(serial) == 'device'
+            if booted:
+                sock.sendall(b'booted\n')
+            sock.close()
+        except (OSError, ConnectionError, ValueError):
+            sock.close()
+
+    def interactive_shell(self, sock, serial):
+        prompt = f"{serial}:/ $ ".encode('utf-8')
+        sock.sendall(prompt)
+        pending = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                return
+            pending += chunk
+            while b'\n' in pending:
+                line, pending = pending.split(b'\n', 1)
+                line = line.decode('utf-8')
+                output = "".join(self.shell_command(part.strip(), serial) for part in line.split(';') if part.strip())
+                # A pty echoes the input line and ends every output line with CR LF.
+                sock.sendall(f"{line}\n{output}".replace('\n', '\r\n').encode('utf-8') + prompt)
+
+    @staticmethod
+    def shell_command(command, serial):
+        args = shlex.split(command)
+        if args[0] == 'echo':
+            if args[1:2] == ['-n']:
+                return " ".join(args[2:])
+            return " ".join(args[1:]) + "\n"
+        if args == ['getprop', 'ro.serialno']:
+            return f"{serial}\n"
+        if args == ['id']:
+            return "uid=2000(shell) gid=2000(shell) groups=2000(shell) context=u:r:shell:s0\n"
+        return f"/system/bin/sh: {args[0]}: inaccessible or not found\n"
+
+    def push(self, tracker):
+        payload = "".join(f"{serial}\t{state}\n" for serial, state in self.states.items()).encode('utf-8')
+        try:
+            tracker.sendall(b'%04x' % len(payload) + payload)
+        except OSError:
+            self.trackers.remove(tracker)
+
+    def changed(self):
+        with self.condition:
+            for tracker in list(self.trackers):
+                self.push(tracker)
+            self.condition.notify_all()
+
+    def attach(self, serial, state='device', booted=True):
+        with self.condition:
+            self.states[serial] = state
+            if booted:
+                self.booted.add(serial)
+        self.changed()
+
+    def detach(self, serial):
+        with self.condition:
+            self.states.pop(serial, None)
+            self.booted.discard(serial)
+        self.changed()
+
+    def boot(self, serial):
+        with self.condition:
+            self.booted.add(serial)
+        self.changed()
+
+    def reboot(self, serial, down=0.3, boot=0.3):
+        """Drop the device, bring it back unbooted after `down` seconds, booted `boot` seconds later."""
+        self.detach(serial)
+
+        def come_back():
+            time.sleep(down)
+            self.attach(serial, booted=False)
+            time.sleep(boot)
+            self.boot(serial)
+
+        threading.Thread(target=come_back, daemon=True).start()
+
+
+def check(name, condition):
+    logging.info(f"{'ok  ' if condition else 'FAIL'} {name}")
+    return bool(condition)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = FakeAdbServer()
+    server.attach('tablet-1')
+    results = []
+    watcher = DeviceWatcher(port=server.port)
+    try:
+        results.append(check("start() returns with the device list filled",
+                             watcher.start() and watcher.is_connected('tablet-1')))
+        results.append(check("boot completed of an attached device",
+                             watcher.wait_until_booted('tablet-1', timeout=5)))
+
+        server.attach('tablet-2', booted=False)
+        results.append(check("connect", watcher.wait_until_connected('tablet-2', timeout=5)))
+        results.append(check("no boot completed before the device booted",
+                             not watcher.wait_until_booted('tablet-2', timeout=0.5)))
+        server.boot('tablet-2')
+        results.append(check("boot completed", watcher.wait_until_booted('tablet-2', timeout=5)))
+
+        server.detach('tablet-2')
+        results.append(check("disconnect", watcher.wait_for(lambda: not watcher.is_connected('tablet-2'), 5)))
+
+        watcher.expect_reboot('tablet-1')
+        server.reboot('tablet-1')
+        results.append(check("reboot of one device waits for the new boot",
+                             not watcher.is_booted('tablet-1') and watcher.wait_until_booted('tablet-1', timeout=5)))
+    finally:
+        watcher.stop()
+
+    # What restart_device() does on the first sim: expect a reboot before the device list is known.
+    fresh = DeviceWatcher(port=server.port)
+    try:
+        fresh.expect_reboot(None)
+        fresh.start()
+        results.append(check("expect_reboot(None) ignores the boot from before the reboot",
+                             not fresh.wait_until_booted(timeout=0.5)))
+        server.reboot('tablet-1')
+        results.append(check("expect_reboot(None) sees the boot after the reboot",
+                             fresh.wait_until_booted(timeout=5)))
+    finally:
+        fresh.stop()
+
+    shell = AdbShell('tablet-1', port=server.port, timeout=5)
+    try:
+        results.append(check("shell output of one command", shell.run("getprop ro.serialno") == 'tablet-1'))
+        results.append(check("shell output that contains the command", shell.run("id").startswith("uid=2000")))
+        results.append(check("shell output without a trailing newline",
+                             shell.run("echo -n partial") == 'partial' and shell.run("echo next") == 'next'))
+    finally:
+        shell.close()
+        server.close()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import json
+import logging
+import shutil
+import socket
+import subprocess
+import time
+from pathlib import Path
+
+
+class DeviceContext:
+    """Everything a sim job needs to drive one tablet: adb/Appium, simulators, worker and settings."""
+
+    def __init__(self, serial, device_manager, script_worker, pool, setting_path, appium_port=None):
+        self.serial = serial
+        self.device_manager = device_manager
+        self.script_worker = script_worker
+        self.pool = pool
+        self.setting_path = setting_path
+        self.appium_port = appium_port
+        self.current_vin = None
+        self.current_make = None
+        self.last_results = []
+        self.job_context = None
+
+    def __repr__(self):
+        return f"DeviceContext({self.serial or 'default'})"
+
+
+class DeviceFarm:
+    """Sets up every attached tablet to run sim jobs at once.
+
+    Each device gets its own Appium server port, UiAutomator2 system port, set of HID
+    simulators and copy of setting.json. A serial keeps the port slot it first got for as long
+    as the farm lives, so a tablet attached later never lands on the ports of one already
+    running. COM ports come from `device_farm.json` ({"<serial>": ["COM5", "COM6"], ...}) when
+    present, otherwise the selected ports are split evenly over the devices in the order adb
+    lists them.
+    """
+
+    def __init__(self, watcher, devices_dir, assignment_path=None, appium_base_port=4723, system_base_port=8200):
+        self.watcher = watcher
+        self.devices_dir = Path(devices_dir)
+        self.assignment_path = assignment_path
+        self.appium_base_port = appium_base_port
+        self.system_base_port = system_base_port
+        self.appium_processes = {}
+        self.slots = {}
+
+    def discover(self, timeout=5):
+        self.watcher.start(timeout)
+        serials = sorted(self.watcher.ready_serials())
+        logging.info(f"Device farm found {len(serials)} device(s): {serials}")
+        return serials
+
+    def load_assignment(self):
+        if self.assignment_path and Path(self.assignment_path).exists():
+            with open(self.assignment_path, 'r') as json_file:
+                return json.load(json_file)
+        return {}
+
+    def assign_com_ports(self, serials, com_ports):
+        assignment = self.load_assignment()
+        if assignment:
+            return {serial: [port.split()[0] for port in assignment.get(serial, [])] for serial in serials}
+        mapping = {serial: [] for serial in serials}
+        per_device = max(1, len(com_ports) // max(1, len(serials)))
+        for index, com_port in enumerate(com_ports):
+            mapping[serials[min(index // per_device, len(serials) - 1)]].append(com_port)
+        return mapping
+
+    def slot(self, serial):
+        """Port offset of the device: the one it already has, else the lowest no other serial holds."""
+        if serial not in self.slots:
+            taken = set(self.slots.values())
+            self.slots[serial] = next(index for index in range(len(taken) + 1) if index not in taken)
+        return self.slots[serial]
+
+    def device_capabilities(self, base_caps, serial):
+        caps = dict(base_caps)
+        caps.update({'deviceName': serial, 'udid': serial, 'systemPort': self.system_base_port + self.slot(serial)})
+        return caps
+
+    def appium_port(self, serial):
+        return self.appium_base_port + self.slot(serial)
+
+    def device_setting_path(self, serial):
+        """Where the device's private setting.json lives; the settings service keeps it up to date."""
+        device_dir = self.devices_dir / serial
+        device_dir.mkdir(parents=True, exist_ok=True)
+        return device_dir / "setting.json"
+
+    def ensure_appium(self, port, timeout=60):
+        if self.port_open(port):
+            return True
+        appium = shutil.which("appium")
+        if not appium:
+            logging.error("appium not found on PATH, cannot start a server for the device farm.")
+            return False
+        logging.info(f"Starting Appium server on port {port}")
+        self.appium_processes[port] = subprocess.Popen([appium, "--port", str(port)],
+                                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.port_open(port):
+                return True
+            if self.appium_processes[port].poll() is not None:
+                break
+            time.sleep(0.5)
+        logging.error(f"Appium server on port {port} did not start.")
+        return False
+
+    @staticmethod
+    def port_open(port):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def close(self):
+        for port, process in self.appium_processes.items():
+            if process.poll() is None:
+                process.terminate()
+        self.appium_processes.clear()
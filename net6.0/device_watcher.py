@@ -0,0 +1,291 @@
+import logging
+import socket
+import subprocess
+import threading
+import time
+
+ADB_HOST = '127.0.0.1'
+ADB_PORT = 5037
+BOOT_WAIT_COMMAND = ('while [ "$(getprop sys.boot_completed)" != "1" ] || '
+                     '[ "$(getprop init.svc.bootanim)" = "running" ]; do sleep 1; done; echo booted')
+
+
+class AdbError(Exception):
+    pass
+
+
+def recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("adb server closed the connection")
+        data += chunk
+    return data
+
+
+def adb_request(sock, request):
+    """Send one host-protocol request and check the OKAY/FAIL status."""
+    payload = request.encode('utf-8')
+    sock.sendall(b'%04x' % len(payload) + payload)
+    status = recv_exact(sock, 4)
+    if status != b'OKAY':
+        length = int(recv_exact(sock, 4), 16)
+        raise AdbError(recv_exact(sock, length).decode('utf-8', 'replace'))
+
+
+def transport_request(serial):
+    return f"host:transport:{serial}" if serial else "host:transport-any"
+
+
+class AdbShell:
+    """One shell session on a device, kept open and reused for every command."""
+
+    def __init__(self, serial=None, host=ADB_HOST, port=ADB_PORT, timeout=30):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b''
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def open(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        adb_request(self.sock, transport_request(self.serial))
+        adb_request(self.sock, "shell:")
+        self.buffer = b''
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def run(self, command):
+        """Run `command` in the persistent shell and return its output; reopens the shell once if it died."""
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.open()
+                    return self.exchange(command)
+                except (OSError, ConnectionError, AdbError):
+                    self.close()
+                    if attempt:
+                        raise
+
+    def exchange(self, command):
+        self.counter += 1
+        start, end = f"__AUTOTEST_{self.counter}_START__", f"__AUTOTEST_{self.counter}_END__"
+        # The interactive shell echoes the command line; splitting the markers keeps the echo from matching.
+        self.sock.sendall(f"echo {self.split(start)}; {command}; echo {self.split(end)}\n".encode('utf-8'))
+        start_token, end_token = start.encode('utf-8'), end.encode('utf-8')
+        while True:
+            begin = self.buffer.find(start_token)
+            begin = self.buffer.find(b'\n', begin) if begin >= 0 else -1
+            finish = self.buffer.find(end_token, begin) if begin >= 0 else -1
+            line_end = self.buffer.find(b'\n', finish) if finish >= 0 else -1
+            if line_end >= 0:
+                # Only what the command printed: between the start marker line and the end marker.
+                output, self.buffer = self.buffer[begin + 1:finish], self.buffer[line_end + 1:]
+                return output.decode('utf-8', 'replace').replace('\r', '').strip()
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("device shell closed")
+            self.buffer += chunk
+
+    @staticmethod
+    def split(marker):
+        return f'{marker[:4]}""{marker[4:]}'
+
+
+class DeviceWatcher:
+    """Follows the adb server's track-devices stream and reports device events as they happen.
+
+    Listeners are called as `listener(event, serial, state)` with event one of 'connected',
+    'disconnected', 'authorized', 'unauthorized', 'offline' and 'boot_completed'. Boot completion
+    is detected by one blocking shell command per boot instead of polling getprop from the host.
+    `python adb_stub.py` checks it against a fake adb server.
+    """
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT, adb_path="adb"):
+        self.host = host
+        self.port = port
+        self.adb_path = adb_path
+        self.states = {}
+        self.booted = set()
+        self.awaiting_reboot = set()
+        # expect_reboot() without a serial: no boot counts until some device has gone away.
+        self.reboot_pending = False
+        self.listeners = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.sock = None
+        self.running = False
+        self.connected = threading.Event()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self, timeout=5):
+        """Start tracking (idempotent); returns whether the adb server stream is up."""
+        if self.thread and self.thread.is_alive():
+            # Already tracking: only give a reconnect in progress a moment.
+            return self.connected.wait(min(timeout, 0.2))
+        self.running = True
+        self.thread = threading.Thread(target=self.track, name="adb-track-devices", daemon=True)
+        self.thread.start()
+        return self.connected.wait(timeout)
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def track(self):
+        delay = 0.5
+        started_server = False
+        while self.running:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=5)
+                adb_request(self.sock, "host:track-devices")
+                self.sock.settimeout(None)
+                delay = 0.5
+                while self.running:
+                    length = int(recv_exact(self.sock, 4), 16)
+                    self.update(recv_exact(self.sock, length).decode('utf-8', 'replace'))
+                    # Connected once the first device list is in, so callers never see an empty one.
+                    self.connected.set()
+            except ConnectionRefusedError:
+                if not started_server:
+                    started_server = True
+                    logging.info("adb server not running, starting it.")
+                    try:
+                        subprocess.run([self.adb_path, "start-server"], capture_output=True)
+                    except OSError:
+                        logging.exception("Could not start the adb server")
+                    continue
+            except (OSError, ConnectionError, AdbError, ValueError):
+                if self.running:
+                    logging.warning("Lost adb track-devices stream, reconnecting.")
+            finally:
+                self.connected.clear()
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+            if self.running:
+                # The server dropped (e.g. `adb kill-server`): every device is gone until it is back.
+                self.update('')
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def update(self, payload):
+        states = dict(line.split('\t', 1) for line in payload.splitlines() if '\t' in line)
+        events = []
+        with self.condition:
+            for serial in set(self.states) - set(states):
+                events.append(('disconnected', serial, None))
+                self.booted.discard(serial)
+            for serial, state in states.items():
+                previous = self.states.get(serial)
+                if previous == state:
+                    continue
+                if previous is None:
+                    events.append(('connected', serial, state))
+                if state == 'device':
+                    events.append(('authorized', serial, state))
+                    self.watch_boot(serial)
+                elif state in ('unauthorized', 'offline'):
+                    events.append((state, serial, state))
+                    self.booted.discard(serial)
+            self.states = states
+            for event, serial, state in events:
+                if event in ('disconnected', 'offline'):
+                    self.awaiting_reboot.discard(serial)
+                    self.reboot_pending = False
+            self.condition.notify_all()
+        for event in events:
+            self.emit(*event)
+
+    def emit(self, event, serial, state):
+        logging.info(f"Device {serial}: {event}")
+        for callback in list(self.listeners):
+            try:
+                callback(event, serial, state)
+            except Exception:
+                logging.exception(f"Device event listener failed for {event}")
+
+    def watch_boot(self, serial):
+        def wait_boot():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=5) as sock:
+                    adb_request(sock, transport_request(serial))
+                    adb_request(sock, f"shell:{BOOT_WAIT_COMMAND}")
+                    sock.settimeout(None)
+                    output = b''
+                    while b'booted' not in output:
+                        chunk = sock.recv(1024)
+                        if not chunk:
+                            return
+                        output += chunk
+            except (OSError, ConnectionError, AdbError):
+                return
+            with self.condition:
+                if self.states.get(serial) != 'device' or serial in self.awaiting_reboot or self.reboot_pending:
+                    return
+                self.booted.add(serial)
+                self.condition.notify_all()
+            self.emit('boot_completed', serial, 'device')
+
+        threading.Thread(target=wait_boot, name=f"adb-boot-{serial}", daemon=True).start()
+
+    def expect_reboot(self, serial=None):
+        """Ignore the current boot state of `serial` (any device) until it has gone away and come back."""
+        with self.condition:
+            if not serial:
+                # The device list may not be known yet; hold off every boot until a device drops.
+                self.reboot_pending = True
+            for target in ([serial] if serial else list(self.states)):
+                self.booted.discard(target)
+                self.awaiting_reboot.add(target)
+
+    def ready_serials(self):
+        return [serial for serial, state in self.states.items() if state == 'device']
+
+    def is_connected(self, serial=None):
+        with self.condition:
+            if serial:
+                return self.states.get(serial) == 'device'
+            return bool(self.ready_serials())
+
+    def is_booted(self, serial=None):
+        with self.condition:
+            if serial:
+                return serial in self.booted
+            return any(serial in self.booted for serial in self.ready_serials())
+
+    def wait_for(self, predicate, timeout=None, should_stop=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while not predicate():
+                if should_stop and should_stop():
+                    return False
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Wake up now and then to honour should_stop.
+                self.condition.wait(1.0 if remaining is None else min(remaining, 1.0))
+            return True
+
+    def wait_until_connected(self, serial=None, timeout=None, should_stop=None):
+        return self.wait_for(lambda: self.is_connected(serial), timeout, should_stop)
+
+    def wait_until_booted(self, serial=None, timeout=None, should_stop=None):
+        return self.wait_for(lambda: self.is_booted(serial), timeout, should_stop)
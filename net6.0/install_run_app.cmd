@@ -16,6 +16,8 @@ pip show openpyxl >nul 2>&1 || pip install openpyxl
 pip show psutil >nul 2>&1 || pip install psutil
 pip show hid >nul 2>&1 || pip install hid
 pip show pyserial >nul 2>&1 || pip install pyserial
+pip show watchdog >nul 2>&1 || pip install watchdog
+pip show lxml >nul 2>&1 || pip install lxml
 
 start cmd /k "appium"
 
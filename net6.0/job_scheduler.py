@@ -0,0 +1,95 @@
+import heapq
+import json
+import logging
+import statistics
+import time
+from collections import defaultdict
+
+
+class JobHistory:
+    """Durations and outcomes of earlier sim jobs, from the results store, keyed by make and SIM names.
+
+    Only jobs that actually ran count (cached results took no time). The most recent `window`
+    jobs per key are kept, so a sim that got faster or stopped failing is picked up quickly.
+    """
+
+    def __init__(self, results, window=20):
+        self.results = results
+        self.window = window
+        self.groups = defaultdict(list)
+        self.sims = defaultdict(list)
+        self.makes = defaultdict(list)
+        self.all = []
+
+    def load(self):
+        self.results.flush()
+        rows = self.results.query("SELECT make, sims, duration, outcome FROM sim_jobs"
+                                  " WHERE cached = 0 AND duration IS NOT NULL ORDER BY started")
+        for make, sims, duration, outcome in rows:
+            try:
+                sim_names = tuple(json.loads(sims))
+            except ValueError:
+                continue
+            sample = (duration, outcome == 'failed')
+            self.groups[(make, sim_names)].append(sample)
+            for sim_name in sim_names:
+                self.sims[(make, sim_name)].append(sample)
+            self.makes[make].append(sample)
+            self.all.append(sample)
+        logging.info(f"Job history: {len(rows)} sim job(s) over {len(self.makes)} make(s)")
+        return self
+
+    def samples(self, make, sim_names):
+        """The most specific history there is: this group, its SIMs, its make, then everything."""
+        samples = self.groups.get((make, tuple(sim_names)))
+        if not samples:
+            samples = [sample for sim_name in sim_names for sample in self.sims.get((make, sim_name), [])]
+        if not samples:
+            samples = self.makes.get(make)
+        return (samples or self.all)[-self.window:]
+
+
+class JobScheduler:
+    """Orders sim groups so a scan finishes as early as possible and predicts when that is.
+
+    Every group's expected cost is its median historical duration times (1 + failure rate),
+    since a failed group is retried at the end. Groups are handed out longest first, which
+    with each free device taking the next group is the LPT rule for minimising makespan.
+    """
+
+    def __init__(self, history, default_duration=180.0):
+        self.history = history
+        self.default_duration = default_duration
+
+    def estimate(self, make, sim_names):
+        samples = self.history.samples(make, sim_names)
+        if not samples:
+            return self.default_duration
+        return statistics.median(duration for duration, _ in samples)
+
+    def failure_rate(self, make, sim_names):
+        samples = self.history.samples(make, sim_names)
+        if not samples:
+            return 0.0
+        return sum(failed for _, failed in samples) / len(samples)
+
+    def cost(self, make, sim_names):
+        return self.estimate(make, sim_names) * (1 + self.failure_rate(make, sim_names))
+
+    def order(self, jobs):
+        """`jobs` as (make, sim_names, item) tuples, most expensive first."""
+        return sorted(jobs, key=lambda job: self.cost(job[0], job[1]), reverse=True)
+
+    def predict(self, jobs, workers):
+        """Seconds until `jobs` (in order) finish when each of `workers` devices takes the next free one."""
+        free_at = [0.0] * max(1, workers)
+        for make, sim_names, _ in jobs:
+            heapq.heappush(free_at, heapq.heappop(free_at) + self.cost(make, sim_names))
+        return max(free_at)
+
+    def report(self, jobs, workers):
+        seconds = self.predict(jobs, workers)
+        finish = time.strftime('%H:%M', time.localtime(time.time() + seconds))
+        logging.info(f"Predicted completion: {len(jobs)} sim job(s) on {workers} device(s) in about "
+                     f"{seconds / 60:.1f} min, around {finish}")
+        return seconds
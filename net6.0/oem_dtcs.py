@@ -1,112 +1,219 @@
+import csv
 import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+from workbook_cache import WorkbookCache
 
 
 log_folder = r"C:\Users\nghia\PycharmProjects\Walmart_AutomationTest\Database\Log_file"
 path_file = r"C:\Users\nghia\PycharmProjects\Walmart_AutomationTest\Database\Test Document\All Make_Test Document_V0.16_May222024.xlsx"
-def longest_list(*lists):
-    # Tìm danh sách dài nhất trong các danh sách được truyền vào
-    longest = max(lists, key=len)
-    return longest
-
-def oem_dtcs_expected(sys):
-    df = pd.read_excel(path_file, sheet_name="Jaguar Land Rover")
-    data_system = df.loc[df["VIN"] == "SAJAK4BVXHCP15541"]
-    data_system_2 = data_system.loc[data_system["Functions/SubFunctions"] == "NWS"]
-    data_system_3 = data_system_2.loc[df["Value (US)"] != "Not Support"]
-    data_system_4 = data_system_3.loc[df['7111 7" Android VCI'] == "v"]
-    data_system_5 = data_system_4.loc[data_system_4["System/SubSystem"] == "{0}".format(sys)]
-    sliced_data = data_system_5.copy()
-    sliced_data['combine'] = sliced_data['DTC'].astype(str) + '-' + sliced_data['Status'].astype(str)
-    sliced_data['combine'] = sliced_data['combine'].apply(lambda x: x.lower().replace('|', '/').replace(' ', ''))
-    sliced_data['Value (US)'] = sliced_data['Value (US)'].str.lower()
-    dtc_def_document = sliced_data.set_index('combine')['Value (US)'].to_dict()
-
-    filtered_dict = {}
-    for key, value in dtc_def_document.items():
-        if key.endswith('-nan'):
-            new_key = key.rsplit('-nan', 1)[0]
-            filtered_dict[new_key] = value.strip()
-        else:
-            filtered_dict[key] = value.strip()
-
-    return filtered_dict
-
-a = oem_dtcs_expected("ATCM-All Terrain Control Module")
-print(a)
-
-
-def systems_list_excel():
-    systems_list = []
-    df = pd.read_excel(path_file, sheet_name="Jaguar Land Rover")
-    data_system = df.loc[df["VIN"] == "SAJAK4BVXHCP15541"]
-    data_system_2 = data_system.loc[data_system["Functions/SubFunctions"] == "NWS"]
-    data_system_3 = data_system_2.loc[df["Value (US)"] != "Not Support"]
-    data_system_4 = data_system_3.loc[df['7111 7" Android VCI'] == "v"]
-    data_system_4_tolist = data_system_4["System/SubSystem"].tolist()
-    for i in data_system_4_tolist:
-        i_lower = i.lower().strip()
-        if i_lower not in systems_list:
-            systems_list.append(i_lower)
-    return systems_list
-
-b = systems_list_excel()
-print(b)
-
-for filename in os.listdir(log_folder):
-    if filename.endswith(".txt"):  # Đảm bảo là tệp tin văn bản
-        file_path = os.path.join(log_folder, filename)
-
-        # Đọc nội dung tệp tin
-        with open(file_path, 'r') as file:
-            log_data = file.read()
-
-        def get_oem_dtcs():
-
-            # Regex để tìm [oemModuleDtcs]
-            pattern = r"\[oemModuleDtcs\]: (.*?)\n"
-
-            # Tìm các phần khớp
-            matches = re.findall(pattern, log_data, re.DOTALL)
-
-            if matches:  # Kiểm tra nếu có kết quả
-                # Tìm phần tử dài nhất trong matches
-                oem_dtcs = longest_list(*matches)
-                # print(oem_dtcs)
-                # print(json.dumps(json.loads(oem_dtcs), indent=4))
-                return oem_dtcs
-            else:
-                print(f"No matches found in {filename}")
-
-def compare_lists(system, sub_system, document, actual):
-    # Find elements in document that are not in actual
-    only_in_document = [item for item in document if item not in actual]
-
-    # Find elements in actual that are not in document
-    only_in_actual = [item for item in actual if item not in document]
-
-    # Find elements that are common in both lists
-    common_elements = [item for item in document if item in actual]
-
-
-    # Open the CSV file and write the results
-    with open(csv_file_path, 'a', newline='') as f:
-        writer = csv.writer(f)
-
-        # Write total number of elements in each list
-        new_row = [system, sub_system, 'total DTC/PIDs in document', len(document), 'total DTC/PIDs in actual', len(actual), 'NA']
-        writer.writerow(new_row)
-
-        # Write elements only found in document
-        for item in only_in_document:
-            writer.writerow([system, sub_system, item, 'null', 'null', 'null', 'Fail - only in document'])
-
-        # Write elements only found in actual
-        for item in only_in_actual:
-            writer.writerow([system, sub_system, 'null', 'null', item, 'null', 'Fail - only in app'])
-
-        # Write common elements
-        for item in common_elements:
-            writer.writerow([system, sub_system, item, 'null', item, 'null', 'Pass'])
\ No newline at end of file
+cache_folder = r"C:\Users\nghia\PycharmProjects\Walmart_AutomationTest\Database\cache"
+workbook_cache = WorkbookCache(cache_folder)
+EXPECTED_COLUMNS = ['VIN', 'Functions/SubFunctions', 'System/SubSystem', 'DTC', 'Status', 'Value (US)',
+                    '7111 7" Android VCI']
+# Called with the rows of every comparison; vin_worker hooks in to store them with the job's results.
+comparison_listeners = []
+
+
+class ExpectedDtcs:
+    """Expected `DTC-Status -> Value (US)` tables for every (VIN, system) of a make, built once per sheet.
+
+    A sheet is filtered to supported NWS rows of the 7" Android VCI a single time; the keys
+    are normalised with vectorised string operations and split per VIN and system with one
+    groupby. System names are looked up case- and whitespace-insensitively. A sheet's tables
+    are rebuilt once the workbook cache holds a different version of the document, so a
+    long-lived worker never answers from an edited one.
+    """
+
+    def __init__(self, workbook_cache, path_file=None):
+        self.workbook_cache = workbook_cache
+        self.path_file = path_file
+        self.tables = {}
+        self.systems = {}
+        self.versions = {}
+
+    def load(self, sheet_name):
+        # The content hash of the document the workbook cache serves now; stat()s it, no re-read.
+        version = self.workbook_cache.load_workbook(self.path_file)['hash']
+        if self.versions.get(sheet_name) == version:
+            return
+        df = self.workbook_cache.read_sheet(sheet_name, usecols=EXPECTED_COLUMNS, path_file=self.path_file)
+        df = df[(df["Functions/SubFunctions"] == "NWS") & (df["Value (US)"] != "Not Support")
+                & (df['7111 7" Android VCI'] == "v")]
+        combine = (df['DTC'] + '-' + df['Status']).str.lower().str.replace('|', '/', regex=False) \
+            .str.replace(' ', '', regex=False)
+        # Blank Status cells come back from the cache as '' rather than NaN
+        combine = combine.str.replace(r'-$', '', regex=True)
+        frame = pd.DataFrame({'vin': df['VIN'], 'system': df['System/SubSystem'].str.lower().str.strip(),
+                              'combine': combine, 'value': df['Value (US)'].str.lower().str.strip()})
+
+        tables = {}
+        for (vin, system), group in frame.groupby(['vin', 'system'], sort=False):
+            tables[(vin, system)] = dict(zip(group['combine'], group['value']))
+        systems = {}
+        for vin, system in zip(frame['vin'], frame['system']):
+            systems.setdefault(vin, {})[system] = None
+        self.tables[sheet_name] = tables
+        self.systems[sheet_name] = {vin: list(names) for vin, names in systems.items()}
+        self.versions[sheet_name] = version
+
+    def invalidate(self):
+        self.tables.clear()
+        self.systems.clear()
+        self.versions.clear()
+
+    def expected(self, sheet_name, vin, system):
+        self.load(sheet_name)
+        return dict(self.tables[sheet_name].get((vin, system.lower().strip()), {}))
+
+    def vin_systems(self, sheet_name, vin):
+        self.load(sheet_name)
+        return list(self.systems[sheet_name].get(vin, []))
+
+    def vins(self, sheet_name):
+        self.load(sheet_name)
+        return list(self.systems[sheet_name])
+
+
+expected_dtcs = ExpectedDtcs(workbook_cache, path_file)
+
+
+def oem_dtcs_expected(sys, sheet_name="Jaguar Land Rover", vin="SAJAK4BVXHCP15541"):
+    return expected_dtcs.expected(sheet_name, vin, sys)
+
+
+def systems_list_excel(sheet_name="Jaguar Land Rover", vin="SAJAK4BVXHCP15541"):
+    return expected_dtcs.vin_systems(sheet_name, vin)
+
+
+OEM_DTCS_MARKER = "[oemModuleDtcs]: "
+VIN_PATTERN = re.compile(r"\b([A-HJ-NPR-Z0-9]{17})\b")
+
+
+def find_vin(text):
+    match = VIN_PATTERN.search(text.upper())
+    return match.group(1) if match else None
+
+
+def parse_log_file(file_path):
+    """Stream one log file line by line and decode its longest [oemModuleDtcs] payload.
+
+    Only the longest payload seen so far is kept, so memory stays bounded by one log line
+    however large the file is. The VIN comes from the first log line mentioning one, else
+    from the file name.
+    """
+    longest = None
+    matches = 0
+    vin = None
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            index = line.find(OEM_DTCS_MARKER)
+            if index >= 0:
+                matches += 1
+                payload = line[index + len(OEM_DTCS_MARKER):].rstrip('\r\n')
+                if longest is None or len(payload) > len(longest):
+                    longest = payload
+            elif vin is None and 'VIN' in line.upper():
+                vin = find_vin(line)
+
+    result = {'file': os.path.basename(file_path), 'vin': vin or find_vin(os.path.basename(file_path)),
+              'matches': matches, 'payload_length': len(longest or ''), 'oem_dtcs': None, 'error': None}
+    if longest is None:
+        result['error'] = "no [oemModuleDtcs] entry"
+        return result
+    try:
+        result['oem_dtcs'] = json.loads(longest)
+    except ValueError as e:
+        result['error'] = f"undecodable [oemModuleDtcs] payload: {e}"
+    return result
+
+
+def iter_log_folder(folder, workers=None):
+    """Parse every .txt log of `folder` on a process pool, yielding results as files finish."""
+    file_paths = [os.path.join(folder, filename) for filename in sorted(os.listdir(folder))
+                  if filename.endswith(".txt")]
+    if len(file_paths) < 2 or workers == 1:
+        yield from map(parse_log_file, file_paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(parse_log_file, file_path) for file_path in file_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def oem_dtcs_by_vin(folder, workers=None):
+    """One result per VIN from the logs of `folder`; a VIN logged in several files keeps its largest payload."""
+    results = {}
+    for result in iter_log_folder(folder, workers):
+        if result['error']:
+            print(f"{result['file']}: {result['error']}")
+        key = result['vin'] or result['file']
+        previous = results.get(key)
+        if previous is None or result['payload_length'] > previous['payload_length']:
+            results[key] = result
+    return results
+
+
+def diff_rows(vin, system, sub_system, document, actual):
+    """Report rows of one system: total line, only in document, only in app, common."""
+    document_keys = set(document)
+    actual_keys = set(actual)
+    rows = [[vin, system, sub_system, 'total DTC/PIDs in document', len(document),
+             'total DTC/PIDs in actual', len(actual), 'NA']]
+    rows.extend([vin, system, sub_system, item, 'null', 'null', 'null', 'Fail - only in document']
+                for item in document if item not in actual_keys)
+    rows.extend([vin, system, sub_system, 'null', 'null', item, 'null', 'Fail - only in app']
+                for item in actual if item not in document_keys)
+    rows.extend([vin, system, sub_system, item, 'null', item, 'null', 'Pass']
+                for item in document if item in actual_keys)
+    return rows
+
+
+def publish_comparisons(rows):
+    for callback in list(comparison_listeners):
+        callback(rows)
+
+
+def compare_all(document, actual):
+    """Diff expected against actual DTC/status keys for every (vin, system, sub_system) at once.
+
+    Both arguments map (vin, system, sub_system) to the keys of that system. Membership is
+    checked against hash sets instead of scanning the other list for every item, so a whole
+    make costs one pass over its keys. Systems missing on one side are reported against an
+    empty list.
+    """
+    rows = []
+    for group in dict.fromkeys(list(document) + list(actual)):
+        rows.extend(diff_rows(*group, document.get(group, ()), actual.get(group, ())))
+    publish_comparisons(rows)
+    return rows
+
+
+def write_report(csv_file_path, rows, mode='a'):
+    """Write all report rows with one open and one buffered writerows call."""
+    with open(csv_file_path, mode, newline='', buffering=1024 * 1024) as f:
+        csv.writer(f).writerows(rows)
+
+
+def compare_lists(system, sub_system, document, actual, csv_file_path=None):
+    """Single-system report in the original 7-column layout; written to `csv_file_path` when given."""
+    full_rows = diff_rows(None, system, sub_system, document, actual)
+    publish_comparisons(full_rows)
+    rows = [row[1:] for row in full_rows]
+    if csv_file_path:
+        write_report(csv_file_path, rows)
+    return rows
+
+
+if __name__ == "__main__":
+    # Guarded so the process pool's workers can import this module without re-running it.
+    a = oem_dtcs_expected("ATCM-All Terrain Control Module")
+    print(a)
+
+    b = systems_list_excel()
+    print(b)
+
+    oem_dtcs = oem_dtcs_by_vin(log_folder)
+    print({vin: len(result['oem_dtcs'] or []) for vin, result in oem_dtcs.items()})
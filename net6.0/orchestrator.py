@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+async def blocking(func, *args, **kwargs):
+    """Run a synchronous call (Appium, selenium, the adb shell socket) on the scan's thread pool."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def wait_simulators_ready(tailers, timeout=50, should_stop=None, safety_interval=1.0):
+    """Wait until every simulator answers; the tailers wake the wait from their reader threads.
+
+    Returns False when the timeout expires, `should_stop()` returns True or a simulator exits
+    before it was ready.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def wake(tailer):
+        loop.call_soon_threadsafe(changed.set)
+
+    for tailer in tailers:
+        tailer.add_listener(wake)
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            changed.clear()
+            for tailer in tailers:
+                if not tailer.ready.is_set():
+                    tailer.poll()
+            if all(tailer.ready.is_set() for tailer in tailers):
+                return True
+            if should_stop and should_stop():
+                return False
+            if any(tailer.closed and not tailer.ready.is_set() for tailer in tailers):
+                logging.warning("Simulator exited before it was ready.")
+                return False
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, safety_interval))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for tailer in tailers:
+            tailer.remove_listener(wake)
+
+
+class ScanOrchestrator:
+    """Runs a scan as coroutines on one asyncio loop: a worker per device, a pipeline per sim job.
+
+    `run()` blocks the calling thread until the scan coroutine ends. `cancel()` may be called
+    from any thread, also before `run()`; the scan stops at its next await and every job's
+    cleanup (simulators stopped, journal entries re-queued) runs at once. The caller clears a
+    cancel with `reset()` when its scan starts, before any setup that a Stop may interrupt.
+    No new group is started once `should_stop()` returns True either. Blocking Appium and adb
+    calls go through `blocking()`; a call already running finishes on its thread, and `run()`
+    waits for it so the next scan never shares a device with a leftover call.
+    """
+
+    def __init__(self, max_threads=16, should_stop=None):
+        self.max_threads = max_threads
+        self.should_stop = should_stop
+        self.lock = threading.Lock()
+        self.loop = None
+        self.task = None
+        self.cancelled = False
+
+    def reset(self):
+        with self.lock:
+            self.cancelled = False
+
+    def stopping(self):
+        return self.cancelled or bool(self.should_stop and self.should_stop())
+
+    def run(self, coroutine):
+        return asyncio.run(self.main(coroutine))
+
+    async def main(self, coroutine):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(self.max_threads, thread_name_prefix="scan"))
+        with self.lock:
+            if self.stopping():
+                # Stopped while the scan was being set up.
+                coroutine.close()
+                return None
+            self.loop, self.task = loop, asyncio.current_task()
+        try:
+            return await coroutine
+        except asyncio.CancelledError:
+            logging.info("Scan cancelled.")
+            return None
+        finally:
+            with self.lock:
+                self.loop = self.task = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+
+    async def run_jobs(self, devices, groups, job, prewarm=None, discard=None):
+        """Spread sim groups over the devices; each device takes the next group when it is free.
+
+        `job(device, group, simulators)` is a coroutine; its exceptions are logged without
+        stopping the remaining groups. With `prewarm(device, group, simulators)`, a device whose
+        pool has enough idle simulators besides the running job takes the next group early and
+        prewarms it on them, as long as every other working device still finds a group waiting
+        when it is free; `discard(device, group, simulators)` undoes a prewarm whose job never
+        runs (the scan was stopped).
+        """
+        pending = deque(groups)
+        # Devices whose worker is still running; a worker leaves once there is nothing left for it.
+        working = set(devices)
+        workers = [asyncio.create_task(self.device_worker(device, pending, job, prewarm, discard, working),
+                                       name=f"device-{device.serial}") for device in devices]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def take(self, device, pending):
+        """Next group with simulators assigned from the device's free ones, or None if it has to wait or stop."""
+        while pending and not self.stopping():
+            group = pending[0]
+            try:
+                simulators = device.pool.acquire(len(group), timeout=0)
+            except ValueError:
+                pending.popleft()
+                logging.exception(f"Cannot run {[getattr(f, 'name', f) for f in group]} on {device}")
+                continue
+            if simulators is None:
+                return None
+            pending.popleft()
+            for simulator, sim_file in zip(simulators, group):
+                simulator.sim_file = sim_file
+            return group, simulators
+        return None
+
+    @staticmethod
+    def may_prewarm(device, pending, working):
+        """Only take a group early when the other working devices still have one each after it."""
+        return len(pending) > len(working - {device})
+
+    async def device_worker(self, device, pending, job, prewarm=None, discard=None, working=None):
+        working = set() if working is None else working
+        current = self.take(device, pending)
+        upcoming = warming = None
+        try:
+            while current is not None:
+                group, simulators = current
+                upcoming = None
+                if prewarm and self.may_prewarm(device, pending, working):
+                    upcoming = self.take(device, pending)
+                if upcoming is not None:
+                    warming = asyncio.create_task(prewarm(device, *upcoming), name=f"prewarm-{device.serial}")
+                try:
+                    await job(device, group, simulators)
+                except Exception:
+                    logging.exception(f"Sim job failed for {[getattr(f, 'name', f) for f in group]}")
+                finally:
+                    device.pool.release(simulators)
+                if warming is not None:
+                    try:
+                        await warming
+                    except Exception:
+                        # The job launches its simulators itself when the prewarm did not.
+                        logging.exception(f"Prewarming {[getattr(f, 'name', f) for f in upcoming[0]]} failed")
+                if self.stopping():
+                    # A prewarmed next group is undone below instead of being run.
+                    break
+                current, upcoming, warming = upcoming or self.take(device, pending), None, None
+        finally:
+            working.discard(device)
+            if upcoming is not None:
+                # Stopped while the next group was prewarmed: let the launch finish, then undo it.
+                if warming is not None:
+                    await asyncio.gather(warming, return_exceptions=True)
+                if discard is not None:
+                    await discard(device, *upcoming)
+                device.pool.release(upcoming[1])
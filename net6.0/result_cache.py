@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from workbook_cache import file_sha1
+
+
+class ResultCache:
+    """Outcomes of sim jobs keyed on everything that decides them.
+
+    The key hashes the content of each SIM file, the records matched to them, every
+    test-document row of their VINs (expected values, DTCs, ...), the installed app build and
+    the selected test functions, so a SIM is only re-tested when one of those changed. Only
+    passing outcomes are stored: a failure may be the tablet or the simulator rather than the
+    SIM, and is worth another run. Entries live in
+    `<cache_dir>/<key[:2]>/<key>.json`.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        self.sim_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def sim_hash(self, sim_path):
+        sim_path = Path(sim_path)
+        stat = sim_path.stat()
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            cached = self.sim_hashes.get(sim_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = file_sha1(sim_path)
+        with self.lock:
+            self.sim_hashes[sim_path] = (signature, digest)
+        return digest
+
+    def key(self, sim_paths, records, app_version, functions, rows=()):
+        material = {
+            'sims': [self.sim_hash(path) for path in sim_paths],
+            'records': [record or {} for record in records],
+            'rows': [list(row) for row in rows],
+            'app_version': app_version,
+            'functions': sorted(functions),
+        }
+        return hashlib.sha1(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'r') as json_file:
+                entry = json.load(json_file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable result cache entry {path}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'w') as json_file:
+            json.dump(dict(entry, key=key, stored=time.time()), json_file, indent=2)
+        os.replace(temp_path, path)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def report(self):
+        logging.info(f"Result cache: {self.hits} sim job(s) reused, {self.misses} tested")
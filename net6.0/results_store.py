@@ -0,0 +1,274 @@
+import json
+import logging
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT,
+    host TEXT,
+    started REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS vins (
+    vin TEXT PRIMARY KEY,
+    make TEXT,
+    first_seen REAL,
+    last_seen REAL
+);
+CREATE TABLE IF NOT EXISTS sim_jobs (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs(id),
+    make TEXT,
+    sims TEXT,
+    device TEXT,
+    vin TEXT,
+    app_version TEXT,
+    outcome TEXT,
+    cached INTEGER,
+    started REAL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS sim_jobs_vin ON sim_jobs(vin, app_version);
+CREATE INDEX IF NOT EXISTS sim_jobs_build ON sim_jobs(app_version, outcome);
+CREATE INDEX IF NOT EXISTS sim_jobs_make ON sim_jobs(make, started);
+CREATE INDEX IF NOT EXISTS sim_jobs_run ON sim_jobs(run_id);
+CREATE TABLE IF NOT EXISTS function_results (
+    job_id INTEGER REFERENCES sim_jobs(id),
+    function TEXT,
+    ok INTEGER,
+    duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS function_results_job ON function_results(job_id);
+CREATE INDEX IF NOT EXISTS function_results_function ON function_results(function, ok);
+CREATE TABLE IF NOT EXISTS dtc_comparisons (
+    run_id INTEGER REFERENCES runs(id),
+    vin TEXT,
+    system TEXT,
+    sub_system TEXT,
+    document_key TEXT,
+    actual_key TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS dtc_comparisons_vin ON dtc_comparisons(vin, system);
+CREATE INDEX IF NOT EXISTS dtc_comparisons_run ON dtc_comparisons(run_id, status);
+CREATE TABLE IF NOT EXISTS phase_timings (
+    run_id INTEGER REFERENCES runs(id),
+    name TEXT,
+    start REAL,
+    duration REAL,
+    sim TEXT,
+    vin TEXT,
+    device TEXT,
+    make TEXT
+);
+CREATE INDEX IF NOT EXISTS phase_timings_run ON phase_timings(run_id, name);
+CREATE INDEX IF NOT EXISTS phase_timings_name ON phase_timings(name, make);
+CREATE TABLE IF NOT EXISTS simulator_latency (
+    run_id INTEGER REFERENCES runs(id),
+    make TEXT,
+    sim TEXT,
+    com_port TEXT,
+    service TEXT,
+    count INTEGER,
+    answered INTEGER,
+    p50 REAL,
+    p95 REAL,
+    max REAL,
+    per_second REAL,
+    histogram TEXT,
+    started REAL
+);
+CREATE INDEX IF NOT EXISTS simulator_latency_run ON simulator_latency(run_id, service);
+CREATE INDEX IF NOT EXISTS simulator_latency_service ON simulator_latency(service, make, started);
+"""
+
+
+class ResultsStore:
+    """Local SQLite database of every run, sim job, VIN, test function, DTC comparison, phase timing
+    and simulator latency summary.
+
+    Writes are queued and applied by one writer thread in transactions of up to `batch_size`
+    statements, so recording a result never waits on the disk; a sim job gets its id on that
+    thread too. Reads use their own connection; WAL mode lets them run while the writer is
+    busy. Call `flush()` before a query that must see everything recorded so far.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        self.pending = queue.Queue()
+        self.read_lock = threading.Lock()
+        self.reader = self.connect(check_same_thread=False)
+        self.writer = threading.Thread(target=self.write_loop, name="results-store", daemon=True)
+        self.writer.start()
+
+    def connect(self, **kwargs):
+        connection = sqlite3.connect(str(self.path), timeout=30, **kwargs)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def write_loop(self):
+        connection = self.connect()
+        while True:
+            batch = [self.pending.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    if batch[-1] is None or isinstance(batch[-1], threading.Event):
+                        # A flush or close is written at once instead of waiting for more to batch.
+                        break
+                    batch.append(self.pending.get(timeout=self.flush_interval if len(batch) == 1 else 0.05))
+            except queue.Empty:
+                pass
+            stop = self.apply(connection, batch)
+            if stop:
+                connection.close()
+                return
+
+    def apply(self, connection, batch):
+        stop = False
+        try:
+            with connection:
+                for item in batch:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        continue
+                    elif callable(item):
+                        item(connection)
+                    else:
+                        statement, rows = item
+                        connection.executemany(statement, rows)
+        except sqlite3.Error:
+            logging.exception(f"Could not write {len(batch)} result(s) to {self.path}")
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+        return stop
+
+    def execute(self, statement, rows):
+        self.pending.put((statement, rows))
+
+    def flush(self, timeout=30):
+        """Wait until everything queued so far is committed."""
+        done = threading.Event()
+        self.pending.put(done)
+        return done.wait(timeout)
+
+    def insert_returning_id(self, statement, values):
+        """Insert one row right away (runs and jobs need their id for the rows that follow)."""
+        self.flush()
+        with self.read_lock, self.reader:
+            return self.reader.execute(statement, values).lastrowid
+
+    def start_run(self, kind):
+        return self.insert_returning_id("INSERT INTO runs (kind, host, started) VALUES (?, ?, ?)",
+                                        (kind, socket.gethostname(), time.time()))
+
+    def finish_run(self, run_id):
+        self.execute("UPDATE runs SET finished = ? WHERE id = ?", [(time.time(), run_id)])
+
+    def record_job(self, run_id, make, sims, device, vin, app_version, outcome, started, duration,
+                   results=(), cached=False):
+        """Queue a sim job with its function results; it gets its id when the writer inserts it."""
+        results = list(results)
+
+        def insert(connection):
+            job_id = connection.execute(
+                "INSERT INTO sim_jobs (run_id, make, sims, device, vin, app_version, outcome, cached, started,"
+                " duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, make, json.dumps(list(sims)), device, vin, app_version, outcome, int(cached), started,
+                 duration)).lastrowid
+            connection.executemany(
+                "INSERT INTO function_results (job_id, function, ok, duration, error) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, result['function'], int(result['ok']), result.get('duration'), result.get('error'))
+                 for result in results])
+
+        self.pending.put(insert)
+        if vin:
+            self.execute("INSERT INTO vins (vin, make, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT(vin) DO UPDATE SET last_seen = excluded.last_seen, make = excluded.make",
+                         [(vin, make, started, started)])
+        if not cached:
+            self.record_dtc_comparisons(run_id, [row for result in results
+                                                 for row in result.get('dtc_comparisons') or ()])
+
+    def record_phases(self, run_id, events):
+        """Store tracing.Tracer events of a run."""
+        self.execute("INSERT INTO phase_timings (run_id, name, start, duration, sim, vin, device, make) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(run_id, event['name'], event['start'], event['duration'], event['tags'].get('sim'),
+                       event['tags'].get('vin'), event['tags'].get('device'), event['tags'].get('make'))
+                      for event in events])
+
+    def record_dtc_comparisons(self, run_id, rows):
+        """Store oem_dtcs.compare_all rows (vin, system, sub_system, document key, -, actual key, -, status)."""
+        self.execute("INSERT INTO dtc_comparisons (run_id, vin, system, sub_system, document_key, actual_key, status) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(run_id, row[0], row[1], row[2], row[3], row[5], row[7]) for row in rows
+                      if row[3] != 'total DTC/PIDs in document'])
+
+    def record_latency(self, run_id, make, summaries):
+        """Store sim_traffic.TrafficCapture.detach summaries, one row per simulator and service."""
+        self.execute("INSERT INTO simulator_latency (run_id, make, sim, com_port, service, count, answered, p50, p95,"
+                     " max, per_second, histogram, started) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(run_id, make, summary['sim'], summary['com_port'], service, stats['count'], stats['answered'],
+                       stats['p50'], stats['p95'], stats['max'], stats['per_second'], json.dumps(stats['histogram']),
+                       summary['started'])
+                      for summary in summaries for service, stats in summary['services'].items()])
+
+    def query(self, statement, params=()):
+        with self.read_lock:
+            return self.reader.execute(statement, params).fetchall()
+
+    def regressions(self, old_build, new_build):
+        """VINs whose latest job passed on `old_build` and failed on `new_build`."""
+        return self.query(
+            "WITH latest AS ("
+            "  SELECT vin, app_version, outcome, make, MAX(started) FROM sim_jobs"
+            "  WHERE app_version IN (?, ?) AND vin IS NOT NULL GROUP BY vin, app_version)"
+            " SELECT new.vin, new.make FROM latest AS new JOIN latest AS old ON old.vin = new.vin"
+            " WHERE old.app_version = ? AND old.outcome = 'passed'"
+            " AND new.app_version = ? AND new.outcome = 'failed' ORDER BY new.make, new.vin",
+            (old_build, new_build, old_build, new_build))
+
+    def slowest_makes(self, since=None, limit=10):
+        """Makes by average sim job duration since `since` (epoch seconds, default the last 7 days)."""
+        since = time.time() - 7 * 24 * 3600 if since is None else since
+        return self.query("SELECT make, COUNT(*), AVG(duration), SUM(duration) FROM sim_jobs"
+                          " WHERE started >= ? AND cached = 0 GROUP BY make ORDER BY AVG(duration) DESC LIMIT ?",
+                          (since, limit))
+
+    def slowest_services(self, since=None, limit=10):
+        """Makes and services the simulators answered slowest since `since` (default the last 7 days)."""
+        since = time.time() - 7 * 24 * 3600 if since is None else since
+        return self.query("SELECT make, service, SUM(answered), MAX(p95), AVG(p50) FROM simulator_latency"
+                          " WHERE started >= ? AND answered > 0 GROUP BY make, service"
+                          " ORDER BY MAX(p95) DESC LIMIT ?", (since, limit))
+
+    def latency_regressions(self, old_run, new_run, factor=1.5):
+        """Make/services whose worst p95 in `new_run` is more than `factor` times that of `old_run`."""
+        return self.query(
+            "WITH worst AS (SELECT run_id, make, service, MAX(p95) AS p95 FROM simulator_latency"
+            "  WHERE run_id IN (?, ?) AND answered > 0 GROUP BY run_id, make, service)"
+            " SELECT new.make, new.service, old.p95, new.p95 FROM worst AS new"
+            " JOIN worst AS old ON old.make = new.make AND old.service = new.service"
+            " WHERE old.run_id = ? AND new.run_id = ? AND new.p95 > old.p95 * ? ORDER BY new.p95 / old.p95 DESC",
+            (old_run, new_run, old_run, new_run, factor))
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join(30)
+        with self.read_lock:
+            self.reader.close()
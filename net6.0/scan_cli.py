@@ -0,0 +1,267 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from scan_engine import FUNCTIONS, ScanEngine, ScanOptions, available_com_ports, config
+from scan_journal import FAILED
+
+JOB_KEYS = ('makes', 'com_ports', 'functions', 'document', 'device_farm', 'restart_device', 'resume', 'force_rerun',
+            'retries')
+
+
+def read_job(path):
+    with open(path, 'r', encoding='utf-8') as job_file:
+        job = json.load(job_file)
+    unknown = set(job) - set(JOB_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown job keys {sorted(unknown)} in {path}, expected some of {list(JOB_KEYS)}")
+    return job
+
+
+def job_from_args(args):
+    """A job dict from the command line, on top of the `--job` file when one is given."""
+    job = read_job(args.job) if args.job else {}
+    if args.make:
+        job['makes'] = args.make
+    if args.com:
+        job['com_ports'] = args.com
+    if args.functions:
+        job['functions'] = args.functions
+    if args.document:
+        job['document'] = args.document
+    for key in ('device_farm', 'restart_device', 'resume', 'force_rerun', 'retries'):
+        if getattr(args, key) is not None:
+            job[key] = getattr(args, key)
+    return job
+
+
+def job_options(job):
+    return ScanOptions(functions=job.get('functions', ()), com_ports=job.get('com_ports', ()),
+                       restart_device=job.get('restart_device', False), device_farm=job.get('device_farm', False),
+                       resume=job.get('resume', True), force_rerun=job.get('force_rerun', False),
+                       retries=job.get('retries', 1))
+
+
+def run_job(engine, job):
+    """Run one job to completion and return its summary."""
+    options = job_options(job)
+    makes = list(job.get('makes') or ['all'])
+    available = engine.list_makes()
+    if makes == ['all']:
+        makes, kind = available, "all"
+    else:
+        missing = sorted(set(makes) - set(available))
+        if missing:
+            raise ValueError(f"Unknown make(s) {missing}, available: {available}")
+        kind = f"folder:{makes[0]}" if len(makes) == 1 else "makes:" + ",".join(makes)
+    if job.get('document'):
+        if job['document'] not in engine.list_documents():
+            raise ValueError(f"Test document {job['document']} not found in {config.database_dir}")
+        engine.set_test_document(job['document'])
+
+    warnings = []
+
+    def collect_warning(event, **details):
+        if event == 'warning':
+            warnings.append(details['message'])
+
+    engine.add_listener(collect_warning)
+    engine.options = options
+    start_time = time.time()
+    try:
+        states = engine.scan(makes, kind)
+    finally:
+        engine.listeners.remove(collect_warning)
+    counts = Counter(states.values())
+    return {'kind': kind, 'makes': makes, 'run_id': engine.run_id, 'predicted_duration': engine.prediction,
+            'states': dict(counts),
+            'failed': sorted(key for key, state in states.items() if state == FAILED),
+            'warnings': warnings, 'started': start_time, 'duration': round(time.time() - start_time, 3),
+            'ok': not warnings and counts[FAILED] == 0}
+
+
+class ScanQueue:
+    """Spool directory of scan jobs: `pending/` -> `processing/` -> `done/`.
+
+    `submit()` writes a job file under a temporary name and renames it into `pending/`, so the
+    daemon never reads half a job. The daemon claims the oldest job by renaming it into
+    `processing/` and writes the job with its summary to `done/` when the scan ends. Jobs left
+    in `processing/` by a crash go back to `pending/` on start; the scan journal resumes them.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = Path(queue_dir)
+        self.pending_dir = self.queue_dir / "pending"
+        self.processing_dir = self.queue_dir / "processing"
+        self.done_dir = self.queue_dir / "done"
+        for directory in (self.pending_dir, self.processing_dir, self.done_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, job):
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.json"
+        temp_path = self.queue_dir / f".{name}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as job_file:
+            json.dump(job, job_file, indent=2)
+        os.replace(temp_path, self.pending_dir / name)
+        return self.pending_dir / name
+
+    def recover(self):
+        for path in sorted(self.processing_dir.glob("*.json")):
+            logging.warning(f"Re-queueing interrupted scan job {path.name}")
+            os.replace(path, self.pending_dir / path.name)
+
+    def claim(self):
+        """Move the oldest pending job to processing and return its path, or None when the queue is empty."""
+        for path in sorted(self.pending_dir.glob("*.json")):
+            target = self.processing_dir / path.name
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue
+            return target
+        return None
+
+    def complete(self, path, job, summary):
+        temp_path = self.done_dir / f".{path.name}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as done_file:
+            json.dump({'job': job, 'summary': summary}, done_file, indent=2)
+        os.replace(temp_path, self.done_dir / path.name)
+        path.unlink()
+
+
+def run_command(args):
+    engine = ScanEngine()
+    stop_on_signal(engine)
+    try:
+        job = job_from_args(args)
+        summary = run_job(engine, job)
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+    finally:
+        engine.close()
+    print(json.dumps(summary, indent=2))
+    return 0 if summary['ok'] else 1
+
+
+def submit_command(args):
+    try:
+        job = job_from_args(args)
+        job_options(job)
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+    path = ScanQueue(args.queue).submit(job)
+    print(path)
+    return 0
+
+
+def daemon_command(args):
+    scan_queue = ScanQueue(args.queue)
+    scan_queue.recover()
+    engine = ScanEngine()
+    running = [True]
+
+    def shutdown(signum, frame):
+        logging.info(f"Signal {signum} received, stopping the scan daemon")
+        running[0] = False
+        engine.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    logging.info(f"Scan daemon waiting for jobs in {scan_queue.pending_dir}")
+    try:
+        while running[0]:
+            path = scan_queue.claim()
+            if path is None:
+                time.sleep(args.poll)
+                continue
+            logging.info(f"Starting scan job {path.name}")
+            job = None
+            try:
+                job = read_job(path)
+                summary = run_job(engine, job)
+            except (OSError, ValueError) as e:
+                logging.exception(f"Scan job {path.name} rejected")
+                summary = {'ok': False, 'error': str(e)}
+            except Exception as e:
+                # Finish the job as failed: left in processing/ it would crash every restart again.
+                logging.exception(f"Scan job {path.name} failed")
+                summary = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            if not running[0]:
+                # Interrupted: leave the job in processing so the next start resumes it.
+                break
+            scan_queue.complete(path, job, summary)
+            logging.info(f"Finished scan job {path.name}: {summary}")
+    finally:
+        engine.close()
+    return 0
+
+
+def stop_on_signal(engine):
+    def stop(signum, frame):
+        logging.info(f"Signal {signum} received, stopping the scan")
+        engine.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+
+def ports_command(args):
+    for port in available_com_ports():
+        print(port)
+    return 0
+
+
+def add_job_arguments(parser):
+    parser.add_argument('--job', help="JSON job file; command line options override its values")
+    parser.add_argument('--make', action='append', help="make (SIM files folder) to scan, repeatable; default all")
+    parser.add_argument('--com', action='append', help="HID simulator COM port, repeatable")
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, help="test functions to run")
+    parser.add_argument('--document', help="test document (.xlsx) in the database directory")
+    parser.add_argument('--farm', dest='device_farm', action='store_true', default=None,
+                        help="run on every attached device")
+    parser.add_argument('--restart-device', dest='restart_device', action='store_true', default=None)
+    parser.add_argument('--no-resume', dest='resume', action='store_false', default=None,
+                        help="start a fresh scan instead of resuming an unfinished one")
+    parser.add_argument('--force', dest='force_rerun', action='store_true', default=None,
+                        help="re-run SIM files whose result is cached")
+    parser.add_argument('--retries', type=int, default=None,
+                        help="times a failed sim job is retried at the end of the scan (default 1)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run AutoTest_AllMakes scans without the UI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run one scan and print its summary")
+    add_job_arguments(run_parser)
+    run_parser.set_defaults(handler=run_command)
+
+    submit_parser = commands.add_parser('submit', help="queue a scan for the daemon")
+    add_job_arguments(submit_parser)
+    submit_parser.add_argument('--queue', default=config.scan_queue_dir)
+    submit_parser.set_defaults(handler=submit_command)
+
+    daemon_parser = commands.add_parser('daemon', help="run queued scans one after another until stopped")
+    daemon_parser.add_argument('--queue', default=config.scan_queue_dir)
+    daemon_parser.add_argument('--poll', type=float, default=2.0, help="seconds between queue checks")
+    daemon_parser.set_defaults(handler=daemon_command)
+
+    ports_parser = commands.add_parser('ports', help="list HID simulator COM ports")
+    ports_parser.set_defaults(handler=ports_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,968 @@
+import csv
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from device_farm import DeviceContext, DeviceFarm
+from device_watcher import AdbError, AdbShell, DeviceWatcher
+from job_scheduler import JobHistory, JobScheduler
+from orchestrator import ScanOrchestrator, blocking, wait_simulators_ready
+from session_manager import AppiumSessionManager
+from result_cache import ResultCache
+from results_store import ResultsStore
+from scan_journal import FAILED, PASSED, QUEUED, RUNNING, SKIPPED, ScanJournal
+from settings_service import SettingsService
+from sim_matcher import SimMatcher
+from sim_traffic import TrafficCapture
+from simulator_launcher import SimulatorLauncher, default_simulator_command
+from simulator_pool import Simulator, SimulatorPool, group_sim_files
+from tracing import tracer
+from ui_snapshot import UiSnapshotter
+from vin_worker import ScriptWorker
+from wait_engine import WaitEngine
+from workbook_cache import WorkbookCache
+
+# appium, selenium, psutil, pyserial and pandas are imported by the code that first needs
+# them, so the window opens before they load; startup_benchmark.py keeps an eye on it.
+
+FUNCTIONS = ('all', 'obd2_10modes', 'obd2_livedata', 'nws_dtcs', 'nws_livedata')
+VIN_XPATHS = (
+    "//android.webkit.WebView[@text='Ionic App']/android.view.View/android.view.View/android.view.View/android.view.View/android.view.View[2]/android.view.View/android.view.View[1]//android.view.View[@text]",
+    "//android.webkit.WebView[@text='Ionic App']/android.view.View/android.view.View/android.view.View/android.view.View/android.view.View[2]/android.view.View//android.view.View[@text]",
+    "//android.webkit.WebView[@text='Ionic App']/android.view.View/android.view.View/android.view.View/android.view.View/android.view.View[2]/android.view.View/android.view.View[1]"
+)
+
+
+def get_base_dir():
+    return getattr(sys, 'frozen', False) and sys._MEIPASS or Path(__file__).resolve().parent
+
+
+class Config:
+    def __init__(self):
+        self.base_dir = get_base_dir()
+        self.database_dir = self.base_dir.parent / "database"
+        self.setting_path = self.database_dir / "setting.json"
+        self.cache_dir = self.database_dir / "cache"
+        self.wait_stats_path = self.database_dir / "wait_stats.json"
+        self.simfile_path = self.base_dir.parent / "Sim files"
+        self.all_functions = self.base_dir.parent / "All_Functions.py"
+        self.nws_live_data_functions = self.base_dir.parent / "NWS_LiveData.py"
+        self.obd2_10modes = self.base_dir.parent / "OBD2_10Modes.py"
+        self.obd2_livedata = self.base_dir.parent / "OBD2_LiveData.py"
+        self.nws_dtcs = self.base_dir.parent / "NWS_DTCs.py"
+        self.txt_path = self.base_dir.parent / "VIN Decode.txt"
+        self.devices_dir = self.database_dir / "devices"
+        self.device_farm_path = self.database_dir / "device_farm.json"
+        self.simulator_log_dir = self.database_dir / "simulator_logs"
+        self.simulator_traffic_dir = self.database_dir / "simulator_traffic"
+        self.trace_dir = self.database_dir / "traces"
+        self.journal_path = self.database_dir / "scan_journal.jsonl"
+        self.result_cache_dir = self.database_dir / "result_cache"
+        self.results_db = self.database_dir / "results.db"
+        self.scan_queue_dir = self.database_dir / "scan_queue"
+        self.net_6_dir = self.base_dir.parent / "net6.0"
+        self.auto_source = self.net_6_dir / "AutoTest_AllMakes.py"
+        self.vin_worker = self.net_6_dir / "vin_worker.py"
+        self.ensure_directories_exist()
+
+    def ensure_directories_exist(self):
+        directories = [self.database_dir, self.simfile_path]
+        for directory in directories:
+            directory.mkdir(parents=True, exist_ok=True)
+            logging.info(f"Directory exists or created: {directory}")
+
+config = Config()
+settings_service = SettingsService(config.setting_path)
+workbook_cache = WorkbookCache(config.cache_dir, config.setting_path, config.database_dir, settings=settings_service)
+wait_engine = WaitEngine(config.wait_stats_path)
+
+
+
+class DeviceManager:
+    def __init__(self, desired_caps, appium_server_url, standby_session=False, serial=None, watcher=None):
+        self.desired_caps = desired_caps
+        self.appium_server_url = appium_server_url
+        self.serial = serial
+        self.driver = None
+        self.session = AppiumSessionManager(self.initialize_driver, standby=standby_session)
+        self.watcher = watcher or DeviceWatcher()
+        self.adb_shell = AdbShell(serial)
+        self.ui = UiSnapshotter(lambda: self.driver)
+
+    def adb(self, *args):
+        """adb command line aimed at this device (any device when no serial is set)."""
+        return ["adb"] + (["-s", self.serial] if self.serial else []) + list(args)
+
+    def initialize_driver(self):
+        from appium import webdriver
+        from appium.options.android import UiAutomator2Options
+        try:
+            options = UiAutomator2Options()
+            options.load_capabilities(self.desired_caps)
+            driver = webdriver.Remote(self.appium_server_url, options=options)
+            logging.info("Appium driver initialized.")
+            return driver
+        except Exception as e:
+            logging.error(f"Failed to initialize Appium driver: {e}")
+            return None
+
+    def restart_device(self):
+        try:
+            self.session.discard()
+            self.driver = None
+            self.watcher.start()
+            self.watcher.expect_reboot(self.serial)
+            subprocess.run(self.adb("reboot"), check=True)
+            logging.info("Device is restarting...")
+            if not self.wait_for_device_to_be_ready():
+                logging.warning("Device did not become ready in time.")
+                return False
+            logging.info("Device is fully booted and ready.")
+            self.session.invalidate()
+            return True
+        except subprocess.CalledProcessError:
+            logging.exception("Failed to restart device")
+            return False
+
+    def wait_for_device_to_be_ready(self, timeout=600, should_stop=None):
+        if self.watcher.start():
+            if self.watcher.wait_until_booted(self.serial, timeout=timeout, should_stop=should_stop):
+                logging.info("Device is fully booted and ready.")
+                return True
+            return False
+        logging.warning("adb server not reachable, falling back to polling the device.")
+        return self.poll_device_ready()
+
+    def shell(self, command):
+        """Run a device shell command over the persistent adb shell, or a one-off `adb shell` if that fails."""
+        try:
+            return self.adb_shell.run(command)
+        except (OSError, AdbError):
+            result = subprocess.run(self.adb('shell', command), capture_output=True, text=True, check=True)
+            return result.stdout.strip()
+
+    def app_version(self, package_name):
+        """versionName, versionCode and install time of the installed build, or None if unknown."""
+        try:
+            output = self.shell(f"dumpsys package {package_name}")
+        except (OSError, AdbError, subprocess.CalledProcessError):
+            logging.warning(f"Could not query the version of {package_name}")
+            return None
+        fields = [re.search(rf"{name}=(\S+(?: \d+:\d+:\d+)?)", output)
+                  for name in ('versionName', 'versionCode', 'lastUpdateTime')]
+        if fields[1] is None:
+            return None
+        return "/".join(field.group(1) if field else '' for field in fields)
+
+    def poll_device_ready(self):
+        for _ in range(60):
+            try:
+                boot_completed = self.shell('getprop sys.boot_completed')
+            except subprocess.CalledProcessError:
+                boot_completed = ''
+            if boot_completed == '1' and self.check_device_connection():
+                time.sleep(10)
+                logging.info("Device is fully booted and ready.")
+                return True
+            logging.info("Waiting for device to be ready...")
+            time.sleep(10)
+        return False
+
+    def handle_app_crash(self):
+        logging.error("App crash detected. Restarting driver.")
+        self.restart_uiautomator2_server()
+
+    def restart_uiautomator2_server(self):
+        self.driver = self.session.recreate()
+
+    def ensure_session(self):
+        """Reuse the current Appium session if it still answers, otherwise create a new one."""
+        self.driver = self.session.ensure()
+        return self.driver
+
+    def check_device_connection(self):
+        if self.watcher.start():
+            return self.watcher.is_connected(self.serial)
+        result = subprocess.run(['adb', 'devices'], capture_output=True, text=True)
+        if self.serial:
+            return f"{self.serial}\tdevice" in result.stdout
+        return "device" in result.stdout and "unauthorized" not in result.stdout
+
+    def wait_for_device_connection(self, should_stop=None):
+        """Block until an authorized device is attached, waking on adb events rather than a timer."""
+        if self.watcher.start():
+            if not self.watcher.is_connected(self.serial):
+                logging.info(f"Device {self.serial or ''} not connected. Waiting for it to be attached...")
+            return self.watcher.wait_until_connected(self.serial, should_stop=should_stop)
+        while not self.check_device_connection():
+            if should_stop and should_stop():
+                return False
+            logging.info("Device not connected. Waiting for 10 seconds...")
+            time.sleep(10)
+        return True
+
+    def restart_app(self, package_name, check_ui_ready=False):
+        try:
+            self.shell(f"am force-stop {package_name}")
+            output = self.shell(f"monkey -p {package_name} -c android.intent.category.LAUNCHER 1")
+            if "No activities found" in output:
+                raise RuntimeError(output)
+            self.ui.invalidate()
+            logging.info(f"{package_name} has been restarted successfully.")
+
+            if check_ui_ready and not self.wait_for_app_to_be_ready(package_name):
+                logging.warning(f"{package_name} did not fully load in time.")
+                return False
+
+            return True
+
+        except Exception as e:
+            logging.error(f"Error restarting {package_name}: {e}")
+            return False
+
+    def wait_for_app_to_be_ready(self, package_name, timeout=120):
+        from appium.webdriver.common.appiumby import AppiumBy
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        try:
+            self.ensure_session()
+
+            if not self.driver:
+                logging.error("Appium driver is not properly initialized.")
+                return False
+
+            WebDriverWait(self.driver, timeout).until(
+                EC.presence_of_element_located((AppiumBy.XPATH, "/hierarchy/android.widget.FrameLayout"))
+            )
+            logging.info(f"{package_name} is fully loaded and ready.")
+            return True
+        except TimeoutException:
+            logging.warning(f"App {package_name} did not load the expected element in time.")
+            return False
+
+
+class SimFileManager:
+    def __init__(self, sim_files_path):
+        self.sim_files_path = sim_files_path
+        self.processes = []
+        self.time_to_ready = {}
+        self.stop_requested = False
+        self.launcher = SimulatorLauncher(config.simulator_log_dir, default_simulator_command(config.base_dir))
+        self.capture = TrafficCapture(config.simulator_traffic_dir)
+
+    def stop_running_processes(self):
+        for process in list(self.processes):
+            process.stop()
+            # A process stop_simulators() already detached returns None here; the rest keep their make.
+            self.capture.detach(process)
+        self.processes.clear()
+        if os.name == 'nt':
+            # Simulators left behind by an earlier crashed run still hold their COM ports.
+            subprocess.call(["taskkill", "/F", "/IM", "SimulatorTest.exe"], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+        logging.info("Stopped running processes: SimulatorTest.exe")
+        self.stop_requested = True
+
+    def launch_simulators(self, simulators, folder_path):
+        """Start one SimulatorTest per simulator with the SIM file assigned to it, unless it was prewarmed."""
+        for simulator in simulators:
+            sim_path = Path(folder_path) / simulator.sim_file.name
+            process = simulator.process
+            if process is not None and process.is_running() and process.sim_path == sim_path:
+                continue
+            simulator.process = self.launcher.launch(simulator.com_port, sim_path)
+            self.capture.attach(simulator.process, Path(folder_path).name)
+            self.processes.append(simulator.process)
+        logging.info(f"Simulators running: {[(s.com_port, s.sim_file.name) for s in simulators]}")
+        return [simulator.process for simulator in simulators]
+
+    def stop_simulators(self, processes, make=None):
+        """Stop the simulators and return the traffic summary of each (None when it saw no traffic)."""
+        summaries = []
+        for process in processes:
+            process.stop()
+            summaries.append(self.capture.detach(process, make))
+            if process in self.processes:
+                self.processes.remove(process)
+        return summaries
+
+    def wait_for_completion(self, timeout=600):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            if self.stop_requested:
+                logging.info("Stop requested, exiting wait_for_completion.")
+                break
+            if not any(process.is_running() for process in self.processes):
+                break
+            time.sleep(1)
+
+    async def wait_for_simulators(self, processes, timeout=50, should_stop=None):
+        """False only when the scan ended (`should_stop()`) before every simulator answered."""
+        tailers = [process.tailer for process in processes]
+        ready = await wait_simulators_ready(tailers, timeout, should_stop=should_stop)
+        for tailer in tailers:
+            self.time_to_ready[tailer.label] = tailer.ready_after
+            if not tailer.ready.is_set():
+                logging.warning(f"Simulator for {tailer.label} not answering after {timeout} seconds, continuing.")
+        # As before, a slow simulator does not block the sim: the app may still get its answers.
+        # Ask the scan, not stop_requested: that flag tracks stop_running_processes(), not Stop.
+        return ready or not (should_stop and should_stop())
+
+
+class ScanOptions:
+    """What a scan runs: test functions, HID COM ports and how the devices are handled."""
+
+    def __init__(self, functions=(), com_ports=(), restart_device=False, device_farm=False, resume=True,
+                 force_rerun=False, retries=1):
+        unknown = set(functions) - set(FUNCTIONS)
+        if unknown:
+            raise ValueError(f"Unknown test functions {sorted(unknown)}, expected some of {list(FUNCTIONS)}")
+        self.functions = [function for function in FUNCTIONS if function in functions]
+        self.com_ports = [com_port.split()[0] for com_port in com_ports]
+        self.restart_device = restart_device
+        self.device_farm = device_farm
+        self.resume = resume
+        self.force_rerun = force_rerun
+        self.retries = retries
+
+    def __repr__(self):
+        return (f"ScanOptions(functions={self.functions}, com_ports={self.com_ports}, "
+                f"restart_device={self.restart_device}, device_farm={self.device_farm}, "
+                f"resume={self.resume}, force_rerun={self.force_rerun}, retries={self.retries})")
+
+
+def available_com_ports():
+    import serial.tools.list_ports
+    return [f"{port.device} - {port.description}" for port in serial.tools.list_ports.comports()]
+
+
+class ScanEngine:
+    """Runs Scan Folder / Scan All without any UI; the Tk app and scan_cli.py both drive one.
+
+    Progress reaches the caller through listeners (see `add_listener`) instead of dialogs, so
+    the engine works the same in a window, a terminal or a daemon.
+    """
+    desired_caps = {
+        "platformName": "android",
+        "deviceName": "3c000c4d7641c861eda",
+        "automationName": "uiautomator2",
+        'newCommandTimeout': 0,
+        'skipServerInstallation': True,
+        'uiautomator2ServerLaunchTimeout': 120000
+    }
+    appium_server_url = 'http://localhost:4723'
+    appium_standby_session = True
+
+    def __init__(self, options=None):
+        self.options = options or ScanOptions()
+        self.device_manager = DeviceManager(self.desired_caps, self.appium_server_url, self.appium_standby_session)
+        self.device_manager.watcher.add_listener(self.on_device_event)
+        self.sim_file_manager = SimFileManager(config.simfile_path)
+        self.script_worker = ScriptWorker(config.vin_worker, capabilities=self.desired_caps,
+                                          server_url=self.appium_server_url)
+        self.default_device = DeviceContext(None, self.device_manager, self.script_worker, None, config.setting_path)
+        self.device_farm = DeviceFarm(self.device_manager.watcher, config.devices_dir, config.device_farm_path)
+        self.farm_devices = {}
+        self.journal = ScanJournal(config.journal_path)
+        self.result_cache = ResultCache(config.result_cache_dir)
+        self.results = ResultsStore(config.results_db)
+        self.orchestrator = ScanOrchestrator(should_stop=lambda: not self.scanning)
+        self.run_id = None
+        self.prediction = None
+        self.scanning = False
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """Call `callback(event, **details)` on 'warning', 'prediction', 'vin_tested' and 'scan_finished'."""
+        self.listeners.append(callback)
+
+    def emit(self, event, **details):
+        for callback in list(self.listeners):
+            try:
+                callback(event, **details)
+            except Exception:
+                logging.exception(f"Scan listener failed for {event}")
+
+    def warn(self, message):
+        logging.warning(message)
+        self.emit('warning', message=message)
+
+    def list_makes(self):
+        """Make folders under the SIM files directory."""
+        return [f.name for f in config.simfile_path.iterdir() if f.is_dir()]
+
+    def list_documents(self):
+        """Test documents (.xlsx) in the database directory."""
+        return [file for file in os.listdir(config.database_dir) if file.endswith(".xlsx")]
+
+    def set_test_document(self, file_path):
+        """Use `file_path` (a name in the database directory) as the test document."""
+        try:
+            if settings_service.update(test_document=os.path.basename(file_path)):
+                workbook_cache.invalidate()
+                logging.info(f"Updated setting.json with test_document: {os.path.basename(file_path)}")
+        except OSError:
+            logging.exception("Error updating setting.json")
+
+    def create_simulator_pool(self):
+        com_ports = self.options.com_ports
+        if not com_ports:
+            self.warn("Please select at least one COM port.")
+            return None
+        return SimulatorPool(Simulator(index, com_port) for index, com_port in enumerate(com_ports))
+
+    def create_devices(self):
+        """Device contexts for this scan: the single default tablet, or every attached one in farm mode."""
+        if not self.options.device_farm:
+            self.default_device.pool = self.create_simulator_pool()
+            return [self.default_device] if self.default_device.pool else []
+
+        serials = self.device_farm.discover()
+        com_ports = self.options.com_ports
+        if not serials or not com_ports:
+            self.warn("Device farm needs at least one device and one COM port.")
+            return []
+        assignment = self.device_farm.assign_com_ports(serials, com_ports)
+        devices = []
+        for serial in serials:
+            if not assignment.get(serial):
+                logging.warning(f"No simulators assigned to device {serial}, leaving it out of the farm.")
+                continue
+            device = self.farm_devices.get(serial)
+            if device is None:
+                port = self.device_farm.appium_port(serial)
+                if not self.device_farm.ensure_appium(port):
+                    continue
+                caps = self.device_farm.device_capabilities(self.desired_caps, serial)
+                server_url = f"http://localhost:{port}"
+                setting_path = self.device_farm.device_setting_path(serial)
+                settings_service.sync(setting_path)
+                device_manager = DeviceManager(caps, server_url, self.appium_standby_session, serial=serial,
+                                               watcher=self.device_manager.watcher)
+                script_worker = ScriptWorker(config.vin_worker, capabilities=caps, server_url=server_url,
+                                             env={'ANDROID_SERIAL': serial, 'AUTOTEST_SETTING_PATH': str(setting_path)})
+                device = DeviceContext(serial, device_manager, script_worker, None, setting_path, port)
+                self.farm_devices[serial] = device
+            device.pool = SimulatorPool(Simulator(i, com_port) for i, com_port in enumerate(assignment[serial]))
+            devices.append(device)
+        logging.info(f"Device farm: {[(d.serial, [s.com_port for s in d.pool.simulators]) for d in devices]}")
+        return devices
+
+    def all_devices(self):
+        return [self.default_device] + list(self.farm_devices.values())
+
+    def stop(self):
+        self.sim_file_manager.stop_requested = True
+        self.scanning = False
+        self.orchestrator.cancel()
+
+        self.sim_file_manager.stop_running_processes()
+
+        logging.info("Stopped all current scan processes.")
+
+    def scan(self, folders, kind=None):
+        """Run every matched SIM file of `folders` (make names), resuming an unfinished scan of the same kind.
+
+        Blocks until the scan is done or `stop()` is called; returns the journal state per SIM file.
+        """
+        folders = list(folders)
+        kind = kind or ("all" if len(folders) != 1 else f"folder:{folders[0]}")
+        self.stop()
+        self.sim_file_manager.stop_requested = False
+        self.scanning = True
+        # From here on a Stop (even during device discovery below) ends this scan.
+        self.orchestrator.reset()
+        for device in self.all_devices():
+            device.device_manager.session.reset_stats()
+        tracer.reset()
+        self.result_cache.reset_stats()
+        self.sim_file_manager.capture.reset_stats()
+        self.prediction = None
+        self.journal.begin_scan(kind, folders, resume=self.options.resume)
+        self.run_id = self.results.start_run(kind)
+        logging.info(f"Starting {kind} scan of {folders} with {self.options}")
+        try:
+            devices = self.create_devices()
+            if devices:
+                self.orchestrator.run(self.scan_makes(folders, devices))
+            if self.scanning and devices:
+                self.journal.finish_scan()
+        finally:
+            self.report()
+            self.scanning = False
+            self.emit('scan_finished', kind=kind)
+        return {key: state for key, state in self.journal.states.items() if key.split('/', 1)[0] in folders}
+
+    async def scan_makes(self, folders, devices):
+        """Plan every make's sim groups, run them longest first over the devices, then retry the failures."""
+        history = await blocking(JobHistory(self.results).load)
+        scheduler = JobScheduler(history)
+        plans = {}
+        jobs = []
+        for folder in folders:
+            folder_path, matches, groups = await self.plan_make(folder, devices)
+            for group in groups:
+                plans[id(group)] = (folder, folder_path, matches)
+                jobs.append((folder, [f.name for f in group], group))
+        jobs = scheduler.order(jobs)
+        self.prediction = scheduler.report(jobs, len(devices))
+        self.emit('prediction', seconds=self.prediction, jobs=len(jobs))
+        failed = []
+
+        async def job(device, group, simulators):
+            folder, folder_path, matches = plans[id(group)]
+            passed = False
+            try:
+                passed = await self.run_sim_group(folder, folder_path, group, simulators, matches, device)
+            finally:
+                if not passed and self.scanning:
+                    failed.append(group)
+
+        async def prewarm(device, group, simulators):
+            folder, folder_path, _ = plans[id(group)]
+            await self.prewarm_simulators(folder, folder_path, group, simulators, device)
+
+        groups = [group for _, _, group in jobs]
+        for attempt in range(self.options.retries + 1):
+            if attempt:
+                logging.info(f"Retrying {len(groups)} failed sim job(s), attempt {attempt} of {self.options.retries}")
+            await self.orchestrator.run_jobs(devices, groups, job, prewarm=prewarm, discard=self.discard_prewarmed)
+            groups = [group for _, _, group in scheduler.order(
+                [(plans[id(group)][0], [f.name for f in group], group) for group in failed])]
+            failed.clear()
+            if not groups:
+                break
+        logging.info(f"Completed processing all SIM files of {folders}.")
+
+    async def plan_make(self, folder, devices):
+        """The make's SIM files matched to the test document, journaled and grouped for the simulators."""
+        folder_path = self.sim_file_manager.sim_files_path / folder
+        sim_files = [f for f in folder_path.iterdir() if f.suffix == '.sim' and not f.name.endswith('.correct.sim')]
+        logging.info(f"Scanning folder: {folder} with SIM files: {sim_files}")
+        data = await blocking(self.load_data_excel, folder)
+        data = self.remove_duplicates(data)
+        logging.info(f"Loaded data from sheet {folder}: {data}")
+        matches = SimMatcher(data).resolve(sim_files)
+        valid_sim_files = self.queue_sim_files(folder, sim_files, matches)
+        return folder_path, matches, group_sim_files(valid_sim_files, max_size=min(device.pool.size for device in devices))
+
+    def queue_sim_files(self, folder, sim_files, matches):
+        """Journal the folder's SIM files and return the matched ones this scan still has to run."""
+        valid_sim_files = [f for f in sim_files if matches[f.name].record]
+        self.journal.mark(folder, [f.name for f in sim_files if not matches[f.name].record], SKIPPED)
+        pending = self.journal.pending(folder, valid_sim_files)
+        self.journal.mark(folder, [f.name for f in pending], QUEUED)
+        if len(pending) < len(valid_sim_files):
+            logging.info(f"{folder}: {len(valid_sim_files) - len(pending)} SIM file(s) already done, "
+                         f"{len(pending)} left")
+        return pending
+
+    def report(self):
+        for device in self.all_devices():
+            device.device_manager.session.report()
+            device.device_manager.ui.report()
+        wait_engine.report()
+        wait_engine.save()
+        self.result_cache.report()
+        self.sim_file_manager.capture.report()
+        self.report_trace()
+        self.finish_run()
+
+    def on_device_event(self, event, serial, state):
+        if self.scanning and event in ('disconnected', 'unauthorized', 'offline'):
+            logging.warning(f"Device {serial} {event} during scan; the current sim will wait for it to return.")
+
+    def close(self):
+        self.stop()
+        for device in self.all_devices():
+            device.script_worker.close()
+        self.device_farm.close()
+        self.device_manager.watcher.stop()
+        wait_engine.save()
+        self.journal.close()
+        self.results.close()
+
+    def report_trace(self):
+        tracer.report()
+        try:
+            tracer.export(config.trace_dir)
+        except OSError:
+            logging.exception("Could not write the scan trace")
+
+    def finish_run(self):
+        if self.run_id is None:
+            return
+        self.results.record_phases(self.run_id, tracer.events())
+        self.results.finish_run(self.run_id)
+
+    async def prewarm_simulators(self, selected_folder, folder_path, group, simulators, device):
+        """Start the next group's simulators on idle HIDs so they boot while the tablet tests the current one."""
+        with tracer.span("simulator_prewarm", make=selected_folder, sim=",".join(f.name for f in group),
+                         device=device.serial or "default"):
+            await blocking(self.sim_file_manager.launch_simulators, simulators, folder_path)
+
+    async def discard_prewarmed(self, device, group, simulators):
+        await blocking(self.sim_file_manager.stop_simulators,
+                       [simulator.process for simulator in simulators if simulator.process], group[0].parent.name)
+
+    async def run_sim_group(self, selected_folder, folder_path, group, simulators, matches, device=None):
+        """Run one group of SIM files sharing a prefix on one device, one file per simulator; True if it passed."""
+        device = device or self.default_device
+        device.current_make = selected_folder
+        sim_names = [f.name for f in group]
+        started = time.time()
+        app_version = await blocking(device.device_manager.app_version, 'com.innova.passthru')
+        cache_key = await blocking(self.result_cache_key, selected_folder, folder_path, group, matches, app_version)
+        if cache_key and not self.options.force_rerun:
+            entry = self.result_cache.get(cache_key)
+            if entry:
+                logging.info(f"Unchanged since {time.ctime(entry['stored'])}, reusing result for {sim_names}")
+                await self.discard_prewarmed(device, group, simulators)
+                device.current_vin = entry['vin']
+                self.write_VIN_to_txt(self.vin_txt_path(device), entry['vin'])
+                self.journal.mark(selected_folder, sim_names, PASSED, vin=entry['vin'], cached=True)
+                self.results.record_job(self.run_id, selected_folder, sim_names, device.serial, entry['vin'],
+                                        app_version, PASSED, started, 0.0, entry.get('results', ()), cached=True)
+                return True
+        self.journal.mark(selected_folder, sim_names, RUNNING, device=device.serial)
+        device.last_results = []
+        passed = False
+        try:
+            with tracer.span("sim_group", make=selected_folder, sim=",".join(sim_names),
+                             device=device.serial or "default"):
+                passed = await self.run_traced_sim_group(selected_folder, folder_path, group, simulators, matches, device)
+            if passed and cache_key:
+                self.result_cache.put(cache_key, {'sims': sim_names, 'vin': device.current_vin,
+                                                  'results': device.last_results})
+        finally:
+            if not self.scanning:
+                # Interrupted by Stop or closing the window: run it again on resume.
+                self.journal.mark(selected_folder, sim_names, QUEUED)
+            else:
+                self.journal.mark(selected_folder, sim_names, PASSED if passed else FAILED, vin=device.current_vin)
+                self.results.record_job(self.run_id, selected_folder, sim_names, device.serial, device.current_vin,
+                                        app_version, PASSED if passed else FAILED, started, time.time() - started,
+                                        device.last_results)
+        return passed
+
+    def result_cache_key(self, sheet_name, folder_path, group, matches, app_version):
+        """Key of everything that decides this sim job's outcome, or None when it cannot be worked out."""
+        if not app_version:
+            return None
+        records = [matches[f.name].record if f.name in matches else None for f in group]
+        try:
+            # Every row of the job's VINs, so editing their expected values or DTCs means a re-test.
+            rows = workbook_cache.matching_rows(sheet_name, 'VIN', [record['VIN'] for record in records if record])
+        except (OSError, ValueError):
+            logging.exception(f"Could not read the test document rows of {[f.name for f in group]}")
+            return None
+        try:
+            return self.result_cache.key([Path(folder_path) / f.name for f in group], records, app_version,
+                                         self.options.functions, rows)
+        except OSError:
+            logging.exception(f"Could not hash SIM files {[f.name for f in group]}")
+            return None
+
+    async def run_traced_sim_group(self, selected_folder, folder_path, group, simulators, matches, device):
+        """Launch the simulators, prepare the tablet, wait for both, then read the VIN and run the tests."""
+        with tracer.span("simulator_launch"):
+            processes = await blocking(self.sim_file_manager.launch_simulators, simulators, folder_path)
+        try:
+            sim_file1 = group[0]
+            match = matches.get(sim_file1.name)
+            if match and match.vin is not None:
+                self.update_setting(match.vin, selected_folder, device)
+            else:
+                logging.error(f"No matching record found for SIM file: {sim_file1.name}")
+
+            # The simulators are already booting in the background while the tablet reboots /
+            # reconnects and the app restarts; the readiness wait below picks up where they are.
+            if not await self.prepare_device(device):
+                return False
+
+            with tracer.span("simulator_readiness"):
+                simulators_ready = await self.sim_file_manager.wait_for_simulators(
+                    processes, should_stop=lambda: not self.scanning)
+            if not simulators_ready:
+                logging.error("Failed to connect with simulators after app restart.")
+                return False
+
+            with tracer.span("run_each_VIN"):
+                return await blocking(self.run_each_VIN, selected_folder, device)
+        finally:
+            summaries = await blocking(self.sim_file_manager.stop_simulators, processes, selected_folder)
+            self.results.record_latency(self.run_id, selected_folder, [summary for summary in summaries if summary])
+            wait_engine.save()
+
+    async def prepare_device(self, device):
+        """Reboot the tablet when asked, wait until it is attached and restart the app under test."""
+        device_manager = device.device_manager
+        if self.options.restart_device:
+            with tracer.span("restart_device"):
+                await blocking(device_manager.restart_device)
+
+        with tracer.span("wait_for_device"):
+            if not await blocking(device_manager.wait_for_device_connection, should_stop=lambda: not self.scanning):
+                return False
+
+        with tracer.span("restart_app"):
+            await blocking(device_manager.restart_app, 'com.innova.passthru')
+        return True
+
+    def run_each_VIN(self, selected_folder, device=None):
+        from selenium.webdriver.support.ui import WebDriverWait
+        device = device or self.default_device
+        device.current_vin = None
+        max_retries = 2
+        results = []
+        while True:
+            retries = 0
+            while retries < max_retries:
+                try:
+                    device.device_manager.ensure_session()
+                    WebDriverWait(device.device_manager.driver, 50).until(
+                        lambda driver: device.device_manager.check_device_connection())
+                    self.check_memory_usage(device)
+                    if not device.device_manager.driver or not device.device_manager.driver.session_id:
+                        raise Exception("Appium driver is not properly initialized.")
+                    with tracer.span("find_VIN_mainscreen"):
+                        self.find_VIN_mainscreen(device)
+                    with tracer.span("find_VIN_text"):
+                        text = self.find_VIN_text(device)
+                    logging.info(f"VIN Text: {text}")
+                    if text and "NO VEHICLE INFORMATION" not in text:
+                        self.write_VIN_to_txt(self.vin_txt_path(device), text)
+                        device.current_vin = text
+                        tracer.tag(vin=text)
+
+                        if 'all' in self.options.functions:
+                            logging.info("Running all functions")
+                            results += self.run_all_functions(device)
+                            self.wait_for_app_idle(device)
+                            logging.info("Running NWS live data")
+                            results += self.run_nws_livedata(device)
+                        else:
+                            if 'obd2_10modes' in self.options.functions:
+                                logging.info("Running OBD2 10 Modes functions")
+                                results += self.run_obd2_10modes(device)
+
+                            if 'obd2_livedata' in self.options.functions:
+                                logging.info("Running OBD2 LiveData functions")
+                                results += self.run_obd2_livedata(device)
+
+                            if 'nws_dtcs' in self.options.functions:
+                                logging.info("Running NWS DTCs functions")
+                                results += self.run_nws_dtcs(device)
+
+                            if 'nws_livedata' in self.options.functions:
+                                logging.info("Running NWS live data")
+                                results += self.run_nws_livedata(device)
+                        # self.obd2_led_logic_var = tk.BooleanVar()
+
+                        self.emit('vin_tested', device=device)
+                        device.last_results = results
+                        return all(result['ok'] for result in results)
+                    else:
+                        logging.warning("Do not connect with data sim files")
+                        device.device_manager.restart_app("com.innova.passthru")
+                        retries += 1
+                except Exception:
+                    logging.warning(f"Attempt {retries + 1} failed")
+                    retries += 1
+            if retries == max_retries:
+                text = self.find_VIN_text(device)
+
+                logging.warning("Failed to connect with data sim files after multiple attempts")
+                self.write_VIN_to_txt(self.vin_txt_path(device), text)
+                return False
+            else:
+                retries = 0
+
+    def vin_txt_path(self, device):
+        if device.serial:
+            return config.devices_dir / device.serial / "VIN Decode.txt"
+        return config.txt_path
+
+    def write_VIN_to_txt(self, file_path, text):
+        with open(file_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow([text])
+
+    def find_VIN_text(self, device=None):
+        device = device or self.default_device
+
+        def vin_text():
+            snapshot = device.device_manager.ui.snapshot()
+            for xpath in VIN_XPATHS:
+                text = snapshot.first_text(xpath)
+                if text:
+                    return text
+            return None
+
+        vin_text = wait_engine.until("vin_text", vin_text, make=device.current_make, timeout=60,
+                                     should_stop=lambda: not self.scanning)
+        if vin_text:
+            logging.info(f"Found VIN: {vin_text}")
+        else:
+            logging.warning("Failed to find VIN within the time limit")
+        return vin_text
+
+    def find_VIN_mainscreen(self, device=None):
+        from appium.webdriver.common.appiumby import AppiumBy
+        device = device or self.default_device
+        make = device.current_make
+
+        ui = device.device_manager.ui
+
+        def main_screen():
+            snapshot = ui.snapshot()
+            if any("Toyota" in text for text in snapshot.texts("//android.view.View[@text]")):
+                return "toyota"
+            if any(snapshot.first_text(xpath) for xpath in VIN_XPATHS):
+                return "vin"
+            return None
+
+        def find_button(*xpaths):
+            snapshot = ui.snapshot()
+            for xpath in xpaths:
+                if snapshot.exists(xpath):
+                    return xpath
+            return None
+
+        def click_button(xpath):
+            try:
+                element = device.device_manager.driver.find_element(by=AppiumBy.XPATH, value=xpath)
+                element.click()
+                return True
+            except:
+                return False
+            finally:
+                ui.invalidate()
+
+        def wait_and_click(step, xpath, timeout=5):
+            return bool(wait_engine.until(step, lambda: find_button(xpath), make=make, timeout=timeout)) and click_button(xpath)
+
+        # Wait for whichever comes first, so a car without the Toyota banner does not sit out the deadline.
+        if wait_engine.until("main_screen", main_screen, make=make, timeout=6) == "toyota":
+            tmmc = "//android.widget.Button[@text='TMMC, TMMK Product']"
+            smart_key = "//android.widget.Button[@text='w/ Smart Key']"
+            adk = "//android.widget.Button[@text='w/ ADK Package']"
+            button = wait_engine.until("toyota_options", lambda: find_button(tmmc, smart_key, adk), make=make, timeout=10)
+            if button == tmmc and click_button(tmmc):
+                wait_and_click(
+                    "toyota_product_option",
+                    "//android.app.Dialog/android.view.View/android.view.View[2]/android.view.View/android.view.View[3]/android.view.View/android.view.View[1]/android.view.View")
+                wait_and_click("toyota_product_confirm",
+                               "//android.app.Dialog/android.view.View/android.view.View[3]/android.view.View[4]")
+            elif button is not None and click_button(button):
+                option = find_button("//android.widget.Button[@text='RADAR CRUISE']",
+                                     "//android.widget.Button[@text='w/ EPB']")
+                if option:
+                    click_button(option)
+                if find_button("//android.widget.Button[@text='Yes']"):
+                    click_button("//android.widget.Button[@text='Yes']")
+
+    def check_and_wait_loading_xpath(self, xpath, wait_time=1.5, device=None):
+        device = device or self.default_device
+
+        def present():
+            return device.device_manager.ui.exists(xpath)
+
+        if wait_engine.until("loading_appears", present, make=device.current_make, timeout=wait_time):
+            logging.info(f"'{xpath}' appeared, waiting for it to disappear.")
+            self.wait_for_element_disappearance(xpath, device=device)
+        else:
+            logging.info(f"'{xpath}' did not appear, assuming it already disappeared.")
+
+    def wait_for_element_disappearance(self, xpath, timeout=30, device=None):
+        device = device or self.default_device
+        start_time = time.time()
+
+        def gone():
+            return not device.device_manager.ui.exists(xpath)
+
+        if wait_engine.until("loading_gone", gone, make=device.current_make, timeout=timeout):
+            logging.info(f"Element {xpath} disappeared after {time.time() - start_time:.2f} seconds.")
+            return True
+        logging.warning(f"Timeout: Element {xpath} did not disappear within {timeout} seconds.")
+        return False
+
+    def wait_for_app_idle(self, device=None, timeout=2):
+        """Wait until the app answers again after a test script before starting the next one."""
+        device = device or self.default_device
+        return wait_engine.until("app_idle", lambda: device.device_manager.ui.exists(
+            "/hierarchy/android.widget.FrameLayout"), make=device.current_make, timeout=timeout)
+
+    def check_memory_usage(self, device=None):
+        import psutil
+        device = device or self.default_device
+        process = psutil.Process(os.getpid())
+        memory_usage = process.memory_info().rss / (1024 * 1024)
+        logging.info(f"Memory usage: {memory_usage} MB")
+        if memory_usage > 1000:
+            logging.warning("High memory usage detected. Restarting driver.")
+            device.device_manager.restart_uiautomator2_server()
+
+    def load_data_excel(self, sheet_name):
+        path_file = None
+        try:
+            path_file = workbook_cache.current_document()
+            return workbook_cache.read_records(sheet_name, usecols=['Year', 'Make', 'Model', 'Engine', 'VIN'])
+        except FileNotFoundError:
+            logging.exception(f"File not found: {path_file}")
+        except Exception:
+            logging.exception(f"Error loading data from Excel sheet {sheet_name}")
+        return []
+
+    def remove_duplicates(self, data):
+        unique_data = {frozenset(item.items()): item for item in data}
+        return list(unique_data.values())
+
+    def update_setting(self, vin, sheet_name, device=None):
+        """Freeze the job's settings for `device` and publish them to the settings file its scripts read."""
+        device = device or self.default_device
+        device.job_context = settings_service.job_context(vin, sheet_name, device.serial)
+        try:
+            if settings_service.publish(device.job_context, device.setting_path):
+                logging.info(f"Updated {device.setting_path.name} with VIN: {vin} and sheet_name: {sheet_name}")
+        except OSError:
+            logging.exception(f"Error updating {device.setting_path}")
+        return device.job_context
+
+    def run_test_scripts(self, scripts, device=None):
+        """Run test scripts in the device's long-lived worker for its current VIN and log each outcome."""
+        device = device or self.default_device
+        with tracer.span("script " + "+".join(Path(script).stem for script in scripts)):
+            context = device.job_context.as_settings() if device.job_context else None
+            results = device.script_worker.run(scripts, vin=device.current_vin, context=context)
+        for result in results:
+            if result['ok']:
+                logging.info(f"Success: {result['function']} execution completed in {result['duration']:.1f}s.")
+            else:
+                logging.error(f"Error occurred while running {result['function']}: {result['error']}")
+        return results
+
+    def run_all_functions(self, device=None):
+        logging.info("Running all functions sequentially...")
+        return self.run_test_scripts([config.all_functions], device)
+
+    def run_nws_livedata(self, device=None):
+        logging.info("Running NWS live data sequentially...")
+        return self.run_test_scripts([config.nws_live_data_functions], device)
+
+    def run_obd2_10modes(self, device=None):
+        logging.info("Running OBD2 10 Modes...")
+        return self.run_test_scripts([config.obd2_10modes], device)
+
+    def run_obd2_livedata(self, device=None):
+        logging.info("Running OBD2 LiveData...")
+        return self.run_test_scripts([config.obd2_livedata], device)
+
+    def run_nws_dtcs(self, device=None):
+        logging.info("Running NWS DTCs sequentially...")
+        return self.run_test_scripts([config.nws_dtcs], device)
+
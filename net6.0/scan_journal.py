@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+QUEUED = 'queued'
+RUNNING = 'running'
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+DONE_STATES = (PASSED, FAILED, SKIPPED)
+
+
+class ScanJournal:
+    """Append-only record of a scan's progress so an interrupted Scan All / Scan Folder can resume.
+
+    Every line is one JSON record: a scan being started or finished, or a sim file moving to
+    queued, running, passed, failed or skipped. Writes are flushed immediately and fsync'ed at
+    most every `fsync_interval` seconds, so a crash costs at most the sims finished in that
+    window. Replaying the file keeps only the latest state per sim; a torn last line from a
+    crash is ignored. Once a scan finishes, the next scan starts a fresh journal.
+    """
+
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.scan = None
+        self.states = {}
+        self.last_fsync = 0.0
+        self.file = None
+        self.replay()
+
+    def replay(self):
+        """Rebuild the last scan and its sim states from the journal."""
+        self.scan, self.states = None, {}
+        if not self.path.exists():
+            return
+        start_time = time.time()
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                event = record.get('event')
+                if event == 'scan_started':
+                    self.scan, self.states = record, {}
+                elif event == 'scan_finished':
+                    if self.scan and self.scan['scan'] == record['scan']:
+                        self.scan = dict(self.scan, finished=record['t'])
+                elif event == 'sim':
+                    self.states[record['sim']] = record['state']
+        logging.info(f"Replayed scan journal in {time.time() - start_time:.3f}s: "
+                     f"{len(self.states)} sim(s), unfinished={self.unfinished() is not None}")
+
+    def unfinished(self):
+        if self.scan and 'finished' not in self.scan:
+            return self.scan
+        return None
+
+    def begin_scan(self, kind, folders, resume=True):
+        """Start or resume a scan; returns True when it picks up an unfinished scan of the same kind."""
+        with self.lock:
+            previous = self.unfinished()
+            if resume and previous and previous['kind'] == kind:
+                done = sum(state in DONE_STATES for state in self.states.values())
+                logging.info(f"Resuming {kind} scan {previous['scan']}: {done} sim(s) already done")
+                return True
+            self.close_file()
+            self.scan = {'event': 'scan_started', 'scan': uuid.uuid4().hex[:12], 'kind': kind,
+                         'folders': list(folders), 't': time.time()}
+            self.states = {}
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.write(self.scan, sync=True)
+            return False
+
+    def finish_scan(self):
+        with self.lock:
+            if self.scan is None or 'finished' in self.scan:
+                return
+            record = {'event': 'scan_finished', 'scan': self.scan['scan'], 't': time.time()}
+            self.write(record, sync=True)
+            self.scan = dict(self.scan, finished=record['t'])
+
+    @staticmethod
+    def key(folder, sim_name):
+        return f"{folder}/{sim_name}"
+
+    def state(self, folder, sim_name):
+        return self.states.get(self.key(folder, sim_name))
+
+    def is_done(self, folder, sim_name):
+        return self.state(folder, sim_name) in DONE_STATES
+
+    def pending(self, folder, sim_files):
+        """SIM files of `folder` that still have to run in the current scan."""
+        return [sim_file for sim_file in sim_files if not self.is_done(folder, sim_file.name)]
+
+    def mark(self, folder, sim_names, state, **details):
+        with self.lock:
+            if self.scan is None:
+                return
+            for sim_name in sim_names:
+                key = self.key(folder, sim_name)
+                if self.states.get(key) == state:
+                    continue
+                self.states[key] = state
+                self.write(dict({'event': 'sim', 'scan': self.scan['scan'], 'sim': key, 'state': state,
+                                 't': time.time()}, **details), sync=state in DONE_STATES)
+
+    def write(self, record, sync=False):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+            if self.torn_tail():
+                self.file.write('\n')
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        now = time.monotonic()
+        if sync and now - self.last_fsync >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+
+    def torn_tail(self):
+        """Whether the journal ends in a half-written line left by a crash."""
+        with open(self.path, 'rb') as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() == 0:
+                return False
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) != b'\n'
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        with self.lock:
+            self.close_file()
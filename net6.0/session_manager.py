@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+
+class AppiumSessionManager:
+    """Keeps one Appium session per device and only recreates it when it is really broken.
+
+    `factory()` creates a new driver (or returns None on failure). A session is reused as long
+    as a cheap liveness probe answers. With `standby=True` a replacement is started in the
+    background as soon as the session is known to be gone (device reboot, failed probe), so the
+    next caller only waits for whatever is left of the creation time. UiAutomator2 allows one
+    session per device, which is why the standby is never created next to a live session.
+    """
+
+    def __init__(self, factory, standby=False, probe_timeout=10):
+        self.factory = factory
+        self.standby = standby
+        self.probe_timeout = probe_timeout
+        self.driver = None
+        self.lock = threading.RLock()
+        self.standby_thread = None
+        self.standby_driver = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.creations = 0
+        self.reuses = 0
+        self.creation_seconds = 0.0
+
+    def is_alive(self, driver=None):
+        driver = driver or self.driver
+        if driver is None or not driver.session_id:
+            return False
+        try:
+            driver.current_package
+            return True
+        except Exception:
+            logging.warning("Appium session failed its liveness probe.")
+            return False
+
+    def ensure(self):
+        """Return a healthy driver, reusing the current session whenever it still answers."""
+        with self.lock:
+            if self.is_alive():
+                self.reuses += 1
+                return self.driver
+            self.discard()
+            self.driver = self.take_standby() or self.create()
+            return self.driver
+
+    def recreate(self):
+        """Force a fresh session, e.g. after the app crashed inside UiAutomator2."""
+        with self.lock:
+            self.discard()
+            self.driver = self.take_standby() or self.create()
+            return self.driver
+
+    def invalidate(self):
+        """Forget a session that is known to be dead (device rebooting) and prepare the standby."""
+        with self.lock:
+            self.discard()
+            if self.standby:
+                self.prepare_standby()
+
+    def create(self):
+        start_time = time.time()
+        driver = self.factory()
+        elapsed = time.time() - start_time
+        if driver is not None:
+            self.creations += 1
+            self.creation_seconds += elapsed
+            logging.info(f"Appium session created in {elapsed:.1f}s")
+        return driver
+
+    def discard(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def prepare_standby(self):
+        if self.standby_thread and self.standby_thread.is_alive():
+            return
+
+        def build():
+            self.standby_driver = self.create()
+
+        self.standby_thread = threading.Thread(target=build, name="appium-standby", daemon=True)
+        self.standby_thread.start()
+
+    def take_standby(self):
+        if self.standby_thread is None:
+            return None
+        self.standby_thread.join()
+        self.standby_thread = None
+        driver, self.standby_driver = self.standby_driver, None
+        if driver is not None and self.is_alive(driver):
+            logging.info("Using standby Appium session.")
+            return driver
+        return None
+
+    def report(self):
+        """Session creations avoided since the last reset and the time they would have cost."""
+        average = self.creation_seconds / self.creations if self.creations else 0.0
+        saved_seconds = self.reuses * average
+        logging.info(f"Appium sessions: {self.creations} created, {self.reuses} reused, "
+                     f"~{saved_seconds:.0f}s of session start-up saved")
+        return {'creations': self.creations, 'reuses': self.reuses, 'saved_seconds': saved_seconds}
+
+    def close(self):
+        with self.lock:
+            if self.standby_thread is not None:
+                self.standby_thread.join()
+                self.standby_thread = None
+                if self.standby_driver is not None:
+                    self.driver, self.standby_driver = self.standby_driver, None
+                    self.discard()
+            self.discard()
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+from types import MappingProxyType
+
+
+class JobContext(namedtuple('JobContext', ['vin', 'sheet_name', 'test_document', 'device', 'settings'])):
+    """Immutable view of the settings one sim job runs with."""
+
+    __slots__ = ()
+
+    def as_settings(self):
+        """The job's settings in the setting.json layout the test scripts read."""
+        return dict(self.settings, VIN=self.vin, sheet_name=self.sheet_name)
+
+
+class SettingsService:
+    """Keeps setting.json in memory and writes it only when its content changes.
+
+    Shared settings (test document, ...) are changed with `update()`. Per-job values (VIN and
+    sheet) never touch the shared settings: `job_context()` freezes them together with a
+    snapshot of the shared settings, and `publish()` writes the result to the settings file
+    of the device running the job. Every file is written to a temporary file and renamed
+    into place, so a script never reads a half-written settings file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.settings = self.read(self.path)
+        self.overlays = {}
+        self.written = {self.path: dict(self.settings)}
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, 'r') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            logging.warning(f"{path} not found, starting with empty settings")
+            return {}
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.settings.get(key, default)
+
+    def snapshot(self):
+        with self.lock:
+            return MappingProxyType(dict(self.settings))
+
+    def update(self, **changes):
+        """Change shared settings; every settings file that depends on them is rewritten if needed."""
+        with self.lock:
+            settings = dict(self.settings, **changes)
+            if settings == self.settings:
+                return False
+            self.settings = settings
+            for path in list(self.written):
+                self.sync(path)
+            return True
+
+    def job_context(self, vin, sheet_name, device=None):
+        with self.lock:
+            return JobContext(vin, sheet_name, self.settings.get('test_document'), device, self.snapshot())
+
+    def publish(self, context, path=None):
+        """Make `context` visible to the scripts reading the settings file at `path`."""
+        path = Path(path or self.path)
+        with self.lock:
+            self.overlays[path] = {'VIN': context.vin, 'sheet_name': context.sheet_name}
+            return self.sync(path)
+
+    def render(self, path):
+        return dict(self.settings, **self.overlays.get(path, {}))
+
+    def sync(self, path):
+        path = Path(path)
+        content = self.render(path)
+        if self.written.get(path) == content:
+            return False
+        self.write_atomic(path, content)
+        self.written[path] = content
+        return True
+
+    @staticmethod
+    def write_atomic(path, content):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w') as json_file:
+            json.dump(content, json_file, indent=4)
+        os.replace(temp_path, path)
@@ -0,0 +1,84 @@
+import logging
+from collections import namedtuple, defaultdict
+
+SimMatch = namedtuple('SimMatch', ['sim_file', 'record', 'vin', 'candidates'])
+
+
+class SimMatcher:
+    """Resolves SIM file names to test-document records through an inverted token index.
+
+    A record matches a SIM file when every token of "{Year} {Make} {Model} {Engine}" occurs
+    in the file name. The index is built once per folder; each file then only tests the
+    index keys and the few records filed under the keys it contains.
+    """
+
+    def __init__(self, data):
+        self.records = []
+        self.record_tokens = []
+        frequency = defaultdict(int)
+        for record in data:
+            tokens = set(self.expected_prefix(record).split())
+            if not tokens:
+                # A blank row would otherwise match every SIM file.
+                continue
+            self.records.append(record)
+            self.record_tokens.append(tuple(tokens))
+            for token in tokens:
+                frequency[token] += 1
+        # Each record is indexed under its rarest token only; a file has to contain that token
+        # before the rest of the record is checked, so common tokens like the Make cost nothing.
+        self.index = defaultdict(list)
+        for record_id, tokens in enumerate(self.record_tokens):
+            anchor = min(tokens, key=lambda token: (frequency[token], -len(token)))
+            self.index[anchor].append(record_id)
+        self.longest_anchor = max(map(len, self.index), default=0)
+
+    @staticmethod
+    def expected_prefix(record):
+        return f"{record['Year']} {record['Make']} {record['Model']} {record['Engine']}"
+
+    def candidates(self, sim_name):
+        # Look every substring of the name up in the index rather than scanning all index keys;
+        # a file name is short, the index of a large Make is not.
+        anchors = {sim_name[start:start + length]
+                   for length in range(1, min(self.longest_anchor, len(sim_name)) + 1)
+                   for start in range(len(sim_name) - length + 1)}
+        found = []
+        for anchor in anchors:
+            for record_id in self.index.get(anchor, ()):
+                if all(token in sim_name for token in self.record_tokens[record_id]):
+                    found.append(record_id)
+        return sorted(found)
+
+    def match(self, sim_file):
+        sim_name = getattr(sim_file, 'name', sim_file)
+        candidates = [self.records[record_id] for record_id in self.candidates(sim_name)]
+        # Keep the document order: the first matching row wins, as the sheet order did before.
+        record = candidates[0] if candidates else None
+        return SimMatch(sim_file, record, record['VIN'] if record else None, candidates)
+
+    def resolve(self, sim_files):
+        """Match every SIM file in one pass and log unmatched or ambiguous files."""
+        matches = {}
+        for sim_file in sim_files:
+            match = self.match(sim_file)
+            matches[getattr(sim_file, 'name', sim_file)] = match
+            if match.record is None:
+                logging.warning(f"SIM file {match.sim_file} is not valid")
+            elif self.is_ambiguous(match):
+                vins = sorted({candidate['VIN'] for candidate in match.candidates})
+                logging.warning(f"SIM file {match.sim_file} matches several VINs {vins}, using {match.vin}")
+            else:
+                logging.info(f"SIM file {match.sim_file} is valid with expected prefix "
+                             f"{self.expected_prefix(match.record)}")
+        return matches
+
+    @staticmethod
+    def is_ambiguous(match):
+        return len({candidate['VIN'] for candidate in match.candidates}) > 1
+
+    def unmatched(self, matches):
+        return [name for name, match in matches.items() if match.record is None]
+
+    def ambiguous(self, matches):
+        return [name for name, match in matches.items() if match.record is not None and self.is_ambiguous(match)]
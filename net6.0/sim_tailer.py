@@ -0,0 +1,170 @@
+import codecs
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+READY_MARKER = "Press ESC to exit"
+
+
+class SimOutputTailer:
+    """Follows the output of one SimulatorTest run and flags when the simulator is answering.
+
+    Only bytes appended since the previous poll are read. The simulator counts as ready once
+    `threshold` COM lines with a non-zero response time were printed after the last
+    "Press ESC to exit" banner. Without an `output_file` nothing is polled and the output
+    has to be pushed in through `feed`, e.g. from a stdout pipe.
+    """
+
+    def __init__(self, output_file, label=None, threshold=10):
+        self.output_file = Path(output_file) if output_file else None
+        self.label = label or (self.output_file.name if self.output_file else "simulator")
+        self.threshold = threshold
+        self.ready = threading.Event()
+        self.started = time.monotonic()
+        self.ready_after = None
+        self.offset = 0
+        self.partial = ''
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.banner_seen = False
+        self.valid_com_count = 0
+        self.closed = False
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """Call `callback(tailer)` once the readiness threshold is reached or the output ends."""
+        self.listeners.append(callback)
+        if self.ready.is_set() or self.closed:
+            callback(self)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self):
+        for callback in list(self.listeners):
+            callback(self)
+
+    def close(self):
+        """Mark the output as finished (the simulator exited)."""
+        if self.partial:
+            self.feed_line(self.partial.rstrip('\r'))
+            self.partial = ''
+        self.closed = True
+        self.notify()
+
+    def poll(self):
+        """Read whatever was appended since the last call; returns the number of new bytes."""
+        if self.output_file is None:
+            return 0
+        try:
+            size = os.path.getsize(self.output_file)
+        except OSError:
+            return 0
+        if size < self.offset:
+            # The log was truncated for a new run.
+            self.reset()
+        if size == self.offset:
+            return 0
+        with open(self.output_file, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        self.offset += len(data)
+        self.feed(self.decoder.decode(data))
+        return len(data)
+
+    def reset(self):
+        self.offset = 0
+        self.partial = ''
+        self.decoder.reset()
+        self.banner_seen = False
+        self.valid_com_count = 0
+
+    def feed(self, text):
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self.feed_line(line.rstrip('\r'))
+
+    def feed_line(self, line):
+        if READY_MARKER in line:
+            self.banner_seen = True
+            self.valid_com_count = 0
+            return
+        if not self.banner_seen or not line.startswith("COM") or "[0 ms]" in line:
+            return
+        self.valid_com_count += 1
+        if self.valid_com_count >= self.threshold and not self.ready.is_set():
+            self.ready_after = time.monotonic() - self.started
+            self.ready.set()
+            logging.info(f"Simulator for {self.label} ready after {self.ready_after:.2f} seconds.")
+            self.notify()
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, paths, changed):
+        self.paths = {os.path.normcase(str(path)) for path in paths}
+        self.changed = changed
+
+    def on_any_event(self, event):
+        if os.path.normcase(os.path.abspath(event.src_path)) in self.paths:
+            self.changed.set()
+
+
+def wait_until_ready(tailers, timeout=50, should_stop=None, fallback_interval=0.2):
+    """Block until every tailer is ready, the timeout expires or `should_stop()` returns True.
+
+    Pipe-fed tailers wake the wait themselves. For file-backed ones, file-change notifications
+    from watchdog wake it when watchdog is installed; otherwise the files are polled every
+    `fallback_interval` seconds, which is still only a stat call each.
+    """
+    changed = threading.Event()
+
+    def wake(tailer):
+        changed.set()
+
+    for tailer in tailers:
+        tailer.add_listener(wake)
+    paths = [tailer.output_file.resolve() for tailer in tailers if tailer.output_file]
+    observer = None
+    if paths and Observer is not None:
+        observer = Observer()
+        handler = _ChangeHandler(paths, changed)
+        for directory in {path.parent for path in paths}:
+            observer.schedule(handler, str(directory), recursive=False)
+        observer.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            changed.clear()
+            for tailer in tailers:
+                if not tailer.ready.is_set():
+                    tailer.poll()
+            if all(tailer.ready.is_set() for tailer in tailers):
+                return True
+            if any(tailer.closed and not tailer.ready.is_set() for tailer in tailers):
+                logging.warning("Simulator exited before it was ready.")
+                return False
+            if should_stop and should_stop():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Even with notifications a slow safety poll is kept: Windows may coalesce the
+            # change events of a file that another process keeps open for writing.
+            interval = fallback_interval if paths and observer is None else 1.0
+            changed.wait(min(remaining, interval))
+    finally:
+        for tailer in tailers:
+            tailer.remove_listener(wake)
+        if observer is not None:
+            observer.stop()
+            observer.join()
@@ -0,0 +1,216 @@
+import json
+import logging
+import re
+import struct
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# timestamp (epoch seconds), COM port number, service (first request byte), PID/DID, latency in ms
+RECORD = struct.Struct('<dHBHH')
+MAGIC = b'SIMTRAF1'
+NO_SERVICE = 0xFF
+NO_PID = 0xFFFF
+# UDS services whose identifier is two bytes (ReadDataByIdentifier, WriteDataByIdentifier, IO control).
+TWO_BYTE_IDS = {0x22, 0x2E, 0x2F}
+LINE_PATTERN = re.compile(r"^(?P<port>COM(?P<number>\d+)|\S+)\s+(?P<body>.*?)\s*\[(?P<latency>\d+) ms\]\s*$")
+HEX_BYTE = re.compile(r"^[0-9A-Fa-f]{2}$")
+HISTOGRAM_BOUNDS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def parse_line(line, timestamp=None):
+    """One showdata `COM` line as a record tuple, or None for banners and other output.
+
+    The request is taken from the first run of two-digit hex tokens, so a leading time stamp
+    or CAN id in the line does not matter.
+    """
+    match = LINE_PATTERN.match(line.strip())
+    if not match or not match.group('port').startswith('COM'):
+        return None
+    request = []
+    for token in match.group('body').split():
+        if HEX_BYTE.match(token):
+            request.append(int(token, 16))
+        elif request:
+            break
+    service = request[0] if request else NO_SERVICE
+    id_length = 2 if service in TWO_BYTE_IDS else 1
+    pid = NO_PID
+    if len(request) > id_length:
+        pid = int.from_bytes(bytes(request[1:1 + id_length]), 'big')
+    latency = min(int(match.group('latency')), 0xFFFF)
+    return (timestamp if timestamp is not None else time.time(), int(match.group('number')), service, pid, latency)
+
+
+def service_name(service, pid=NO_PID):
+    if service == NO_SERVICE:
+        return "?"
+    if pid == NO_PID:
+        return f"{service:02X}"
+    return f"{service:02X} {pid:0{4 if service in TWO_BYTE_IDS else 2}X}"
+
+
+class TrafficRing:
+    """Fixed-size ring of packed traffic records; the oldest are overwritten once it is full."""
+
+    def __init__(self, capacity=50000):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.next = 0
+        self.count = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def append(self, record):
+        with self.lock:
+            RECORD.pack_into(self.buffer, self.next * RECORD.size, *record)
+            self.next = (self.next + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.dropped += 1
+
+    def __len__(self):
+        return self.count
+
+    def to_bytes(self):
+        """The records oldest first, packed."""
+        with self.lock:
+            if self.count < self.capacity:
+                return bytes(self.buffer[:self.count * RECORD.size])
+            split = self.next * RECORD.size
+            return bytes(self.buffer[split:] + self.buffer[:split])
+
+    def records(self):
+        return list(RECORD.iter_unpack(self.to_bytes()))
+
+
+def write_capture(path, ring, metadata):
+    """MAGIC, metadata length (u32), metadata JSON, then the packed records."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = json.dumps(dict(metadata, record_format=RECORD.format, records=len(ring),
+                             dropped=ring.dropped)).encode('utf-8')
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as capture_file:
+        capture_file.write(MAGIC + struct.pack('<I', len(header)) + header + ring.to_bytes())
+    temp_path.replace(path)
+
+
+def read_capture(path):
+    """(metadata, records) of a capture written by `write_capture`."""
+    with open(path, 'rb') as capture_file:
+        data = capture_file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a simulator traffic capture")
+    offset = len(MAGIC) + 4
+    (length,) = struct.unpack_from('<I', data, len(MAGIC))
+    metadata = json.loads(data[offset:offset + length])
+    return metadata, list(RECORD.iter_unpack(data[offset + length:]))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def histogram(latencies):
+    """Counts per latency bucket: `<= bound` for each HISTOGRAM_BOUNDS value, then the overflow."""
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for latency in latencies:
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS) if latency <= bound), len(HISTOGRAM_BOUNDS))
+        counts[index] += 1
+    return counts
+
+
+def summarize(records):
+    """Latency and throughput per service and per service + PID.
+
+    `[0 ms]` lines are requests the simulator did not answer; they count towards throughput
+    but not towards the latency figures.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[service_name(record[2])].append(record)
+        if record[3] != NO_PID:
+            groups[service_name(record[2], record[3])].append(record)
+    summary = {}
+    for key, group in groups.items():
+        latencies = sorted(record[4] for record in group if record[4] > 0)
+        span = group[-1][0] - group[0][0]
+        summary[key] = {
+            'count': len(group),
+            'answered': len(latencies),
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'max': latencies[-1] if latencies else None,
+            'per_second': round(len(group) / span, 3) if span > 0 else None,
+            'histogram': histogram(latencies),
+        }
+    return summary
+
+
+class TrafficCapture:
+    """Records every showdata line of the running simulators and keeps the traffic per sim.
+
+    `attach(process, make)` hooks a SimulatorProcess's output; each COM line becomes a 15-byte
+    record in that simulator's ring buffer. `detach()` (when the simulator stops) writes the ring
+    to `<capture_dir>/<make>/<log name>.bin` and returns its per-service summary; only the first
+    detach of a process does. Latencies of the whole scan are also pooled per make and service
+    for `report()`.
+    """
+
+    def __init__(self, capture_dir, capacity=50000):
+        self.capture_dir = Path(capture_dir)
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.rings = {}
+        self.reset_stats()
+
+    def attach(self, process, make=None):
+        ring = TrafficRing(self.capacity)
+        with self.lock:
+            self.rings[process] = (ring, make)
+
+        def on_line(process, line):
+            record = parse_line(line)
+            if record is not None:
+                ring.append(record)
+
+        process.line_listeners.append(on_line)
+
+    def detach(self, process, make=None):
+        """Stop capturing `process`; `make` defaults to the one it was attached with."""
+        with self.lock:
+            ring, attached_make = self.rings.pop(process, (None, None))
+        if ring is None or not len(ring):
+            return None
+        make = make or attached_make
+        records = ring.records()
+        summary = summarize(records)
+        with self.lock:
+            for record in records:
+                if record[4] > 0:
+                    self.latencies[(make, service_name(record[2]))].append(record[4])
+        path = self.capture_dir / (make or "unknown") / f"{process.log_path.stem}.bin"
+        try:
+            write_capture(path, ring, {'com_port': process.com_port, 'sim': process.sim_path.name, 'make': make})
+        except OSError:
+            logging.exception(f"Could not write simulator traffic to {path}")
+        return {'com_port': process.com_port, 'sim': process.sim_path.name, 'started': records[0][0],
+                'services': summary}
+
+    def reset_stats(self):
+        with self.lock:
+            self.latencies = defaultdict(list)
+
+    def report(self, limit=10):
+        with self.lock:
+            pooled = {key: sorted(values) for key, values in self.latencies.items()}
+        slowest = sorted(pooled.items(), key=lambda item: percentile(item[1], 0.95), reverse=True)[:limit]
+        for (make, service), latencies in slowest:
+            logging.info(f"Simulator latency {make} service {service}: {len(latencies)} answers, "
+                         f"p50 {percentile(latencies, 0.5)} ms, p95 {percentile(latencies, 0.95)} ms, "
+                         f"max {latencies[-1]} ms")
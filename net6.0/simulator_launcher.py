@@ -0,0 +1,108 @@
+import logging
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from sim_tailer import SimOutputTailer
+
+
+def default_simulator_command(base_dir):
+    """SimulatorTest.exe on Windows, `dotnet SimulatorTest.dll` elsewhere; AUTOTEST_SIMULATOR_COMMAND overrides both.
+
+    e.g. AUTOTEST_SIMULATOR_COMMAND="python simulator_stub.py" to run without HID hardware.
+    """
+    override = os.environ.get("AUTOTEST_SIMULATOR_COMMAND")
+    if override:
+        return shlex.split(override, posix=os.name != 'nt')
+    if os.name == 'nt':
+        return [str(Path(base_dir) / "SimulatorTest.exe")]
+    return ["dotnet", str(Path(base_dir) / "SimulatorTest.dll")]
+
+
+def ensure_console_stdin():
+    """Give a windowed (PyInstaller --windowed) process a hidden console to hand down as stdin.
+
+    SimulatorTest waits on Console.ReadKey, which throws when its stdin is a pipe. Children
+    inherit our stdin, so without a console of our own they would get a pipe.
+    """
+    if os.name != 'nt' or sys.stdin is not None:
+        return
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    if kernel32.GetConsoleWindow():
+        return
+    if kernel32.AllocConsole():
+        ctypes.windll.user32.ShowWindow(kernel32.GetConsoleWindow(), 0)
+
+
+class SimulatorProcess:
+    """One running SimulatorTest with its own log file and stdout reader thread."""
+
+    def __init__(self, popen, com_port, sim_path, log_path, tailer):
+        self.popen = popen
+        self.com_port = com_port
+        self.sim_path = Path(sim_path)
+        self.log_path = Path(log_path)
+        self.tailer = tailer
+        self.line_listeners = []
+        self.reader = threading.Thread(target=self.read_output, name=f"sim-{com_port}", daemon=True)
+
+    @property
+    def pid(self):
+        return self.popen.pid
+
+    def read_output(self):
+        with open(self.log_path, 'w', encoding='utf-8', newline='') as log_file:
+            for line in iter(self.popen.stdout.readline, ''):
+                log_file.write(line)
+                log_file.flush()
+                self.tailer.feed(line)
+                for callback in self.line_listeners:
+                    callback(self, line)
+        self.tailer.close()
+
+    def is_running(self):
+        return self.popen.poll() is None
+
+    def stop(self, timeout=5):
+        if self.is_running():
+            self.popen.terminate()
+            try:
+                self.popen.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+                self.popen.wait()
+        self.reader.join(timeout)
+        logging.info(f"Stopped simulator on {self.com_port} for {self.sim_path.name}")
+
+
+class SimulatorLauncher:
+    """Starts SimulatorTest directly with per-job arguments instead of rewriting shared .bat files."""
+
+    def __init__(self, log_dir, command, readiness_threshold=10):
+        self.log_dir = Path(log_dir)
+        self.command = list(command)
+        self.readiness_threshold = readiness_threshold
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+
+    def log_path(self, com_port, sim_path):
+        stem = re.sub(r'[^\w.-]+', '_', Path(sim_path).stem)
+        return self.log_dir / f"{time.strftime('%Y%m%d_%H%M%S')}_{com_port}_{stem}.txt"
+
+    def launch(self, com_port, sim_path, showdata=True):
+        com_port = com_port.split()[0]
+        argv = self.command + [com_port, str(sim_path)] + (["showdata"] if showdata else [])
+        log_path = self.log_path(com_port, sim_path)
+        ensure_console_stdin()
+        popen = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                 encoding='utf-8', errors='replace', bufsize=1)
+        tailer = SimOutputTailer(None, label=Path(sim_path).name, threshold=self.readiness_threshold)
+        process = SimulatorProcess(popen, com_port, sim_path, log_path, tailer)
+        process.reader.start()
+        logging.info(f"Started simulator pid {popen.pid} on {com_port} with {Path(sim_path).name}, log {log_path}")
+        return process
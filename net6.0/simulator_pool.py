@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+
+def sim_prefix(sim_name):
+    return sim_name.split('_')[0]
+
+
+def group_sim_files(sim_files, max_size=None):
+    """Group SIM files sharing the same prefix anywhere in the folder, keeping folder order.
+
+    Groups larger than `max_size` (the number of simulators) are split into chunks that fit.
+    """
+    groups = OrderedDict()
+    for sim_file in sim_files:
+        groups.setdefault(sim_prefix(getattr(sim_file, 'name', sim_file)), []).append(sim_file)
+    result = []
+    for group in groups.values():
+        size = max_size or len(group)
+        result.extend(group[start:start + size] for start in range(0, len(group), size))
+    return result
+
+
+class Simulator:
+    def __init__(self, index, com_port):
+        self.index = index
+        self.com_port = com_port.split()[0]
+        self.sim_file = None
+        self.process = None
+
+    def __repr__(self):
+        return f"Simulator({self.index}, {self.com_port})"
+
+
+class SimulatorPool:
+    """A fixed set of HID simulators handed out to sim jobs as they become free."""
+
+    def __init__(self, simulators):
+        self.simulators = list(simulators)
+        self.free = list(self.simulators)
+        self.condition = threading.Condition()
+        self.closed = False
+
+    @property
+    def size(self):
+        return len(self.simulators)
+
+    def acquire(self, count, timeout=None):
+        """Take `count` free simulators, waiting until enough are released; None on timeout or close."""
+        if count > self.size:
+            raise ValueError(f"Job needs {count} simulators but the pool only has {self.size}")
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or len(self.free) >= count, timeout):
+                return None
+            if self.closed:
+                return None
+            taken, self.free = self.free[:count], self.free[count:]
+            return taken
+
+    def release(self, simulators):
+        with self.condition:
+            for simulator in simulators:
+                simulator.sim_file = None
+                simulator.process = None
+                if simulator not in self.free:
+                    self.free.append(simulator)
+            self.free.sort(key=lambda simulator: simulator.index)
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
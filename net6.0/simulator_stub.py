@@ -0,0 +1,34 @@
+"""Stand-in for SimulatorTest.exe when no HID simulator is attached (e.g. on a Linux dev box).
+
+Takes the same arguments, `"COM1" "file1.sim" "showdata" ["COM2" "file2.sim"]`, prints the same
+banner and then emits COM response lines with random timings until it is killed.
+"""
+import os
+import random
+import sys
+import time
+
+
+def main(argv):
+    ports = [arg for arg in argv if arg.upper().startswith("COM") or arg.startswith("/dev/")]
+    sim_files = [arg for arg in argv if arg.lower().endswith(".sim")]
+    if not ports or len(ports) != len(sim_files):
+        print("not support arguments : COMX FILESIM.sim", flush=True)
+        return 1
+    delay = float(os.environ.get("SIMULATOR_STUB_DELAY", "0.5"))
+    interval = float(os.environ.get("SIMULATOR_STUB_INTERVAL", "0.1"))
+    for port, sim_file in zip(ports, sim_files):
+        print(f"Connected to ComportName {port} , load file simulation successful {sim_file}", flush=True)
+    print("===========================================", flush=True)
+    print("Press ESC to exit", flush=True)
+    time.sleep(delay)
+    pids = ["01 00", "01 0C", "01 0D", "09 02", "03", "19 02 FF", "22 F1 90"]
+    while True:
+        port = random.choice(ports)
+        latency = random.choice([0, random.randint(5, 120)])
+        print(f"{port} {random.choice(pids)} [{latency} ms]", flush=True)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+NET6_DIR = Path(__file__).resolve().parent
+# Packages that only a scan needs; importing any of them at startup is a regression.
+DEFERRED_PACKAGES = ('pandas', 'numpy', 'openpyxl', 'lxml', 'appium', 'selenium', 'psutil', 'serial')
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def parse_import_times(stderr):
+    """Imports of a `python -X importtime` run as (module, self_us, cumulative_us, depth), in import order."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def direct_imports(imports, module):
+    """What `module` imported itself; importtime lists children right before their parent."""
+    index = next(i for i, entry in enumerate(imports) if entry[0] == module and entry[3] == 0)
+    children = []
+    for entry in reversed(imports[:index]):
+        if entry[3] == 0:
+            break
+        if entry[3] == 1:
+            children.append(entry)
+    return children
+
+
+def measure(module, python=sys.executable):
+    """Import `module` in a fresh interpreter; returns the wall time and the per-module import times."""
+    start_time = time.perf_counter()
+    process = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=NET6_DIR,
+                             capture_output=True, text=True)
+    wall_time = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+    return wall_time, parse_import_times(process.stderr)
+
+
+def benchmark(module, runs=5, python=sys.executable):
+    measure(module, python)  # warm the OS file cache and __pycache__
+    wall_times, samples = [], []
+    for _ in range(runs):
+        wall_time, imports = measure(module, python)
+        wall_times.append(wall_time)
+        samples.append(imports)
+    last = samples[-1]
+    target = next(entry for entry in last if entry[0] == module and entry[3] == 0)
+    children = sorted(direct_imports(last, module), key=lambda entry: entry[2], reverse=True)
+    slowest = sorted(last, key=lambda entry: entry[1], reverse=True)
+    deferred = sorted({entry[0] for entry in last if entry[0].split('.')[0] in DEFERRED_PACKAGES})
+    return {
+        'module': module,
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'wall_ms': [round(wall_time * 1000, 1) for wall_time in wall_times],
+        'median_ms': round(statistics.median(wall_times) * 1000, 1),
+        'import_ms': round(target[2] / 1000, 1),
+        'direct_imports': [(entry[0], round(entry[2] / 1000, 1)) for entry in children[:15]],
+        'slowest_modules': [(entry[0], round(entry[1] / 1000, 1)) for entry in slowest[:10]],
+        'deferred_imported': deferred,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long the tool takes to import, and fail over budget.")
+    parser.add_argument('--module', action='append',
+                        help="module to import, repeatable (default AutoTest_AllMakes and scan_cli)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('AUTOTEST_STARTUP_BUDGET_MS', 1500)),
+                        help="fail when the median wall time of a module exceeds this")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    failures = []
+    results = []
+    for module in args.module or ['AutoTest_AllMakes', 'scan_cli']:
+        result = benchmark(module, args.runs)
+        results.append(result)
+        logging.info(f"{module}: median {result['median_ms']} ms over {args.runs} runs "
+                     f"(import {result['import_ms']} ms), budget {args.budget_ms} ms")
+        for name, cumulative_ms in result['direct_imports']:
+            logging.info(f"    {cumulative_ms:8.1f} ms  {name}")
+        logging.info("  slowest modules (self time): " + ", ".join(
+            f"{name} {self_ms} ms" for name, self_ms in result['slowest_modules']))
+        if result['median_ms'] > args.budget_ms:
+            failures.append(f"{module} took {result['median_ms']} ms, over the {args.budget_ms} ms budget")
+        if result['deferred_imported']:
+            failures.append(f"{module} imports {result['deferred_imported']} at startup")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+    for failure in failures:
+        logging.error(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from adb_stub import FakeAdbServer
+from device_watcher import AdbShell, DeviceWatcher
+
+
+@pytest.fixture
+def server():
+    server = FakeAdbServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def watcher(server):
+    watcher = DeviceWatcher(port=server.port)
+    yield watcher
+    watcher.stop()
+
+
+class Recorder:
+    """Collects `(event, serial)` pairs from DeviceWatcher listeners."""
+
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+
+    def __call__(self, event, serial, state):
+        with self.condition:
+            self.events.append((event, serial))
+            self.condition.notify_all()
+
+    def wait_for(self, event, serial, timeout=5):
+        with self.condition:
+            return self.condition.wait_for(lambda: (event, serial) in self.events, timeout)
+
+    def of(self, serial):
+        return [event for event, event_serial in self.events if event_serial == serial]
+
+
+def test_connect_and_boot_events_in_order(server, watcher):
+    recorder = Recorder()
+    watcher.add_listener(recorder)
+    assert watcher.start()
+    server.attach('tablet-1', booted=False)
+    assert watcher.wait_until_connected('tablet-1', timeout=5)
+    assert not watcher.wait_until_booted('tablet-1', timeout=0.3)
+    server.boot('tablet-1')
+    assert recorder.wait_for('boot_completed', 'tablet-1')
+    assert recorder.of('tablet-1') == ['connected', 'authorized', 'boot_completed']
+
+
+def test_disconnect_event(server, watcher):
+    server.attach('tablet-1')
+    recorder = Recorder()
+    watcher.add_listener(recorder)
+    assert watcher.start() and watcher.wait_until_booted('tablet-1', timeout=5)
+    server.detach('tablet-1')
+    assert recorder.wait_for('disconnected', 'tablet-1')
+    assert not watcher.is_connected('tablet-1')
+
+
+def test_reboot_events_in_order(server, watcher):
+    server.attach('tablet-1')
+    assert watcher.start() and watcher.wait_until_booted('tablet-1', timeout=5)
+    recorder = Recorder()
+    watcher.add_listener(recorder)
+    watcher.expect_reboot('tablet-1')
+    server.reboot('tablet-1')
+    assert not watcher.is_booted('tablet-1')
+    assert watcher.wait_until_booted('tablet-1', timeout=5)
+    assert recorder.of('tablet-1') == ['disconnected', 'connected', 'authorized', 'boot_completed']
+
+
+def test_events_of_other_devices_keep_their_serial(server, watcher):
+    server.attach('tablet-1')
+    assert watcher.start() and watcher.wait_until_booted('tablet-1', timeout=5)
+    recorder = Recorder()
+    watcher.add_listener(recorder)
+    server.attach('tablet-2')
+    assert recorder.wait_for('boot_completed', 'tablet-2')
+    assert recorder.of('tablet-1') == []
+    assert recorder.of('tablet-2') == ['connected', 'authorized', 'boot_completed']
+
+
+@pytest.mark.parametrize("command, output", [
+    ("getprop ro.serialno", "tablet-1"),
+    ("id", "uid=2000(shell) gid=2000(shell) groups=2000(shell) context=u:r:shell:s0"),
+    ("echo -n partial", "partial"),
+    ("echo one; echo two", "one\ntwo"),
+])
+def test_adb_shell_output(server, command, output):
+    server.attach('tablet-1')
+    shell = AdbShell('tablet-1', port=server.port, timeout=5)
+    try:
+        assert shell.run(command) == output
+        # The session stays usable for the next command.
+        assert shell.run("echo next") == "next"
+    finally:
+        shell.close()
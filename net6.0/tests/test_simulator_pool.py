@@ -0,0 +1,75 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from sim_tailer import wait_until_ready
+from simulator_launcher import SimulatorLauncher
+from simulator_pool import Simulator, SimulatorPool, group_sim_files
+
+STUB = Path(__file__).resolve().parent.parent / "simulator_stub.py"
+
+
+def make_pool(count):
+    return SimulatorPool(Simulator(index, f"COM{index + 1} (HID)") for index in range(count))
+
+
+@pytest.mark.parametrize("count", [1, 2, 5])
+def test_pool_hands_out_every_simulator_once(count):
+    pool = make_pool(count)
+    taken = [pool.acquire(1, timeout=0)[0] for _ in range(count)]
+    assert [simulator.com_port for simulator in taken] == [f"COM{index + 1}" for index in range(count)]
+    assert pool.acquire(1, timeout=0) is None
+    with pytest.raises(ValueError):
+        pool.acquire(count + 1)
+
+
+def test_pool_release_wakes_a_waiting_job():
+    pool = make_pool(2)
+    first = pool.acquire(2, timeout=0)
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(2, timeout=5)))
+    waiter.start()
+    pool.release(first)
+    waiter.join(5)
+    assert [simulator.index for simulator in got[0]] == [0, 1]
+
+
+def test_pool_close_ends_waits():
+    pool = make_pool(1)
+    pool.acquire(1, timeout=0)
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(1, timeout=5)))
+    waiter.start()
+    pool.close()
+    waiter.join(5)
+    assert got == [None]
+
+
+def test_group_sim_files_splits_groups_to_pool_size():
+    names = ["A_1.sim", "B_1.sim", "A_2.sim", "A_3.sim"]
+    assert group_sim_files(names, max_size=2) == [["A_1.sim", "A_2.sim"], ["A_3.sim"], ["B_1.sim"]]
+
+
+def test_pool_runs_stub_simulators(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIMULATOR_STUB_DELAY", "0")
+    monkeypatch.setenv("SIMULATOR_STUB_INTERVAL", "0.02")
+    pool = make_pool(3)
+    launcher = SimulatorLauncher(tmp_path / "logs", [sys.executable, str(STUB)], readiness_threshold=3)
+    simulators = pool.acquire(3, timeout=0)
+    processes = [launcher.launch(simulator.com_port, tmp_path / f"VIN{simulator.index}.sim")
+                 for simulator in simulators]
+    try:
+        assert wait_until_ready([process.tailer for process in processes], timeout=20)
+        assert all(process.is_running() for process in processes)
+        assert len({process.pid for process in processes}) == 3
+    finally:
+        for process in processes:
+            process.stop()
+        pool.release(simulators)
+    for process, simulator in zip(processes, simulators):
+        log = process.log_path.read_text(encoding='utf-8')
+        assert f"Connected to ComportName {simulator.com_port}" in log
+        assert f"VIN{simulator.index}.sim" in log
+    assert len(pool.free) == 3
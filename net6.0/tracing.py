@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Tracer:
+    """Records one span per phase of a sim job and tells where the wall-clock time of a scan went.
+
+    Spans nest per asyncio task (or thread), so a device worker's phases end up under its sim
+    group, including calls it hands to a worker thread. Tags set with `tag()` (sim, device,
+    VIN, ...) apply to every span still open in that task and to the ones started after it,
+    which lets the VIN found halfway through a sim label the whole sim.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.context = contextvars.ContextVar('trace_stack', default=())
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+            self.started_at = time.time()
+
+    def stack(self):
+        return self.context.get()
+
+    @staticmethod
+    def lane():
+        """Timeline a new top-level span is drawn on: the asyncio task, else the thread."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return task.get_name() if task else threading.current_thread().name
+
+    @contextmanager
+    def span(self, name, **tags):
+        stack = self.stack()
+        record = {'name': name, 'start': time.perf_counter(), 'tags': dict(tags),
+                  'thread': stack[-1]['thread'] if stack else self.lane(), 'depth': len(stack)}
+        if stack:
+            # Inherit the context of the enclosing span (sim, device, VIN so far).
+            record['tags'] = dict(stack[-1]['tags'], **record['tags'])
+        token = self.context.set(stack + (record,))
+        try:
+            yield record
+        except (Exception, asyncio.CancelledError) as e:
+            record['tags']['error'] = type(e).__name__
+            raise
+        finally:
+            self.context.reset(token)
+            record['duration'] = time.perf_counter() - record['start']
+            with self.lock:
+                self.spans.append(record)
+
+    def tag(self, **tags):
+        for record in self.stack():
+            record['tags'].update(tags)
+
+    def events(self):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda record: record['start'])
+            origin = self.origin
+        return [{'name': record['name'], 'start': round(record['start'] - origin, 6),
+                 'duration': round(record['duration'], 6), 'thread': record['thread'], 'depth': record['depth'],
+                 'tags': {key: str(value) for key, value in record['tags'].items()}} for record in spans]
+
+    def export_jsonl(self, path):
+        with open(path, 'w') as trace_file:
+            for event in self.events():
+                trace_file.write(json.dumps(event) + '\n')
+
+    def export_chrome(self, path):
+        """Write a trace for chrome://tracing or Perfetto: one complete ('X') event per span."""
+        threads = {}
+        trace_events = []
+        for event in self.events():
+            tid = threads.setdefault(event['thread'], len(threads) + 1)
+            trace_events.append({'name': event['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                                 'ts': int(event['start'] * 1e6), 'dur': int(event['duration'] * 1e6),
+                                 'args': event['tags']})
+        trace_events.extend({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                             'args': {'name': thread}} for thread, tid in threads.items())
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    def export(self, trace_dir, prefix="scan"):
+        """Write the JSONL and Chrome traces of the current scan; returns their paths."""
+        trace_dir = Path(trace_dir)
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        jsonl_path = trace_dir / f"{prefix}-{stamp}.jsonl"
+        chrome_path = trace_dir / f"{prefix}-{stamp}.trace.json"
+        self.export_jsonl(jsonl_path)
+        self.export_chrome(chrome_path)
+        logging.info(f"Trace written to {jsonl_path} and {chrome_path}")
+        return jsonl_path, chrome_path
+
+    def summary(self):
+        """Total, count and share of the scan's wall-clock time per phase (nested time counted once per phase)."""
+        events = self.events()
+        if not events:
+            return {}
+        wall = max(event['start'] + event['duration'] for event in events) - min(event['start'] for event in events)
+        totals = defaultdict(lambda: [0.0, 0])
+        for event in events:
+            totals[event['name']][0] += event['duration']
+            totals[event['name']][1] += 1
+        return {name: {'seconds': seconds, 'count': count, 'share': seconds / wall if wall else 0.0}
+                for name, (seconds, count) in sorted(totals.items(), key=lambda item: -item[1][0])}
+
+    def report(self):
+        summary = self.summary()
+        for name, entry in summary.items():
+            logging.info(f"Trace {name}: {entry['seconds']:.1f}s over {entry['count']} span(s), "
+                         f"{entry['share']:.0%} of wall-clock")
+        return summary
+
+
+tracer = Tracer()
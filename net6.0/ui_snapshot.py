@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+ROOT_TAG = "hierarchy"
+_lxml = []
+
+
+def lxml_etree():
+    """lxml.etree, imported on the first snapshot; None when lxml is not installed."""
+    if not _lxml:
+        try:
+            from lxml import etree
+        except ImportError:
+            etree = None
+        _lxml.append(etree)
+    return _lxml[0]
+
+
+class UiSnapshot:
+    """One parsed copy of the screen's UI hierarchy, queried locally with (compiled) XPath.
+
+    Appium's `page_source` is the same tree `find_elements` searches on the device, so
+    presence and text checks give the same answers without one HTTP round trip per element.
+    Without lxml the standard library's ElementTree is used, which covers the XPath subset
+    used by the test flow (descendant/child steps, `[@attr]`, `[@attr='v']` and `[n]`).
+    """
+
+    compiled = {}
+
+    def __init__(self, source, taken_at=None):
+        self.source = source
+        self.taken_at = taken_at or time.monotonic()
+        self.digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        data = source.encode('utf-8')
+        etree = lxml_etree()
+        if etree is not None:
+            self.root = etree.fromstring(data, parser=etree.XMLParser(huge_tree=True, recover=True))
+        else:
+            self.root = ElementTree.fromstring(data)
+
+    @classmethod
+    def xpath(cls, expression):
+        query = cls.compiled.get(expression)
+        if query is None:
+            query = cls.compiled[expression] = lxml_etree().XPath(expression)
+        return query
+
+    def find(self, expression):
+        if lxml_etree() is not None:
+            return self.xpath(expression)(self.root)
+        return self.root.findall(self.relative(expression))
+
+    @staticmethod
+    def relative(expression):
+        """Rewrite an absolute Appium XPath into the relative form ElementTree understands."""
+        if expression.startswith('//'):
+            return '.' + expression
+        prefix = f"/{ROOT_TAG}"
+        if expression.startswith(prefix):
+            return '.' + expression[len(prefix):]
+        return expression
+
+    def exists(self, expression):
+        return bool(self.find(expression))
+
+    def texts(self, expression):
+        return [element.get('text') for element in self.find(expression) if element.get('text')]
+
+    def first_text(self, expression):
+        texts = self.texts(expression)
+        return texts[0] if texts else None
+
+    def age(self):
+        return time.monotonic() - self.taken_at
+
+
+class UiSnapshotter:
+    """Hands out UI snapshots of one device's screen and only re-parses when the screen changed.
+
+    `snapshot()` fetches `page_source` (one round trip) unless the current snapshot is younger
+    than `max_age` and has not been invalidated; an unchanged page source reuses the parsed
+    tree. Call `invalidate()` after anything that changes the screen (clicks, app restarts).
+    """
+
+    def __init__(self, driver_getter, max_age=0.0):
+        self.driver_getter = driver_getter
+        self.max_age = max_age
+        self.current = None
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.parses = 0
+
+    def snapshot(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        with self.lock:
+            if self.current is not None and self.current.age() <= max_age:
+                return self.current
+            source = self.driver_getter().page_source
+            self.fetches += 1
+            if self.current is not None and self.current.source == source:
+                self.current.taken_at = time.monotonic()
+            else:
+                self.current = UiSnapshot(source)
+                self.parses += 1
+            return self.current
+
+    def invalidate(self):
+        with self.lock:
+            self.current = None
+
+    def exists(self, expression, max_age=None):
+        return self.snapshot(max_age).exists(expression)
+
+    def texts(self, expression, max_age=None):
+        return self.snapshot(max_age).texts(expression)
+
+    def report(self):
+        logging.info(f"UI snapshots: {self.fetches} page sources fetched, {self.parses} parsed")
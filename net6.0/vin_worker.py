@@ -0,0 +1,292 @@
+"""Long-lived process that runs the per-VIN test scripts (All_Functions.py, NWS_DTCs.py, ...).
+
+The orchestrator starts it once with `python vin_worker.py --connect HOST:PORT` and sends it jobs
+over a local multiprocessing connection. Heavy modules are imported once at start-up and the
+scripts are executed in-process with runpy, so a VIN no longer pays interpreter start-up and
+pandas/appium/selenium imports for every function. Scripts may call `vin_worker.shared_driver()`
+to reuse the worker's warm Appium session instead of opening their own, and
+`vin_worker.job_context()` for the VIN and settings of the job without re-reading setting.json.
+Rows of the oem_dtcs comparisons a script makes come back in its result as `dtc_comparisons`.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import runpy
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+WARM_MODULES = ["pandas", "openpyxl", "appium.webdriver", "selenium.webdriver"]
+AUTHKEY_ENV = "AUTOTEST_WORKER_KEY"
+JOB_CONTEXT_ENV = "AUTOTEST_JOB_CONTEXT"
+
+_driver = None
+_driver_factory = None
+_job_context = {}
+_dtc_comparisons = []
+
+
+def shared_driver():
+    """Appium session kept alive by the worker across scripts and VINs."""
+    global _driver
+    if _driver is not None:
+        try:
+            _driver.current_package
+            return _driver
+        except Exception:
+            logging.warning("Shared Appium session is gone, creating a new one.")
+            _driver = None
+    if _driver_factory is not None:
+        _driver = _driver_factory()
+    return _driver
+
+
+def job_context():
+    """Settings of the job being run (VIN, sheet_name, test_document, ...), as setting.json would hold them."""
+    if _job_context:
+        return dict(_job_context)
+    # Scripts started on their own by ScriptWorker.run_cold get the context through the environment.
+    return json.loads(os.environ.get(JOB_CONTEXT_ENV) or '{}')
+
+
+def set_driver_factory(factory):
+    global _driver_factory
+    _driver_factory = factory
+
+
+def appium_driver_factory(capabilities, server_url):
+    def create():
+        from appium import webdriver
+        from appium.options.android import UiAutomator2Options
+        options = UiAutomator2Options()
+        options.load_capabilities(capabilities)
+        return webdriver.Remote(server_url, options=options)
+    return create
+
+
+def warm_up(modules=WARM_MODULES):
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logging.warning(f"Worker could not pre-import {module}")
+
+
+def run_script(script):
+    """Execute one test script as __main__ and describe the outcome."""
+    script = Path(script)
+    start_time = time.time()
+    result = {'function': script.stem, 'script': str(script), 'ok': True, 'error': None}
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    sys.argv = [str(script)]
+    sys.path.insert(0, str(script.parent))
+    try:
+        runpy.run_path(str(script), run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            result.update(ok=False, error=f"exit code {e.code}")
+    except Exception:
+        result.update(ok=False, error=traceback.format_exc())
+    finally:
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+    result['duration'] = time.time() - start_time
+    return result
+
+
+def collect_dtc_comparisons():
+    try:
+        import oem_dtcs
+    except ImportError:
+        logging.warning("Worker could not import oem_dtcs, DTC comparisons are not collected")
+        return
+    oem_dtcs.comparison_listeners.append(_dtc_comparisons.extend)
+
+
+def serve(address, authkey):
+    global _job_context
+    warm_up()
+    collect_dtc_comparisons()
+    with Client(address, authkey=authkey) as connection:
+        connection.send({'type': 'hello', 'pid': os.getpid()})
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message['type'] == 'stop':
+                break
+            if message['type'] == 'driver':
+                set_driver_factory(appium_driver_factory(message['capabilities'], message['server_url']))
+                connection.send({'type': 'ok', 'id': message['id']})
+                continue
+            _job_context = message.get('context') or {}
+            results = []
+            for script in message['scripts']:
+                _dtc_comparisons.clear()
+                result = run_script(script)
+                result['vin'] = message.get('vin')
+                # compare_lists() does not know the VIN; the job does.
+                result['dtc_comparisons'] = [[row[0] or result['vin']] + list(row[1:]) for row in _dtc_comparisons]
+                results.append(result)
+                connection.send({'type': 'result', 'id': message['id'], 'result': result})
+            connection.send({'type': 'done', 'id': message['id'], 'results': results})
+    if _driver is not None:
+        try:
+            _driver.quit()
+        except Exception:
+            pass
+
+
+class ScriptWorker:
+    """Orchestrator-side handle on a vin_worker process; restarts it if it dies."""
+
+    def __init__(self, worker_script, python="python", capabilities=None, server_url=None, env=None,
+                 job_timeout=1800):
+        self.worker_script = Path(worker_script)
+        self.python = python
+        self.job_timeout = job_timeout
+        self.env = dict(os.environ, **(env or {}))
+        self.capabilities = capabilities
+        self.server_url = server_url
+        self.lock = threading.Lock()
+        self.process = None
+        self.connection = None
+        self.job_id = 0
+
+    def start(self, timeout=60):
+        authkey = secrets.token_bytes(16)
+        accepted = []
+
+        def accept(listener):
+            try:
+                accepted.append(listener.accept())
+            except OSError:
+                pass
+
+        with Listener(('127.0.0.1', 0), authkey=authkey) as listener:
+            env = dict(self.env, **{AUTHKEY_ENV: authkey.hex()})
+            host, port = listener.address
+            self.process = subprocess.Popen([self.python, str(self.worker_script), "--connect", f"{host}:{port}"],
+                                            env=env)
+            thread = threading.Thread(target=accept, args=(listener,), daemon=True)
+            thread.start()
+            deadline = time.time() + timeout
+            while thread.is_alive() and self.process.poll() is None and time.time() < deadline:
+                thread.join(0.5)
+        if not accepted:
+            self.close()
+            raise OSError(f"Script worker {self.worker_script} did not connect")
+        self.connection = accepted[0]
+        try:
+            # The worker says hello once its pre-imports are done; it may die during them.
+            if not self.connection.poll(max(0.0, deadline - time.time())):
+                raise TimeoutError(f"Script worker {self.worker_script} did not finish starting")
+            hello = self.connection.recv()
+        except EOFError:
+            self.kill()
+            raise OSError(f"Script worker {self.worker_script} exited while starting") from None
+        except OSError:
+            self.kill()
+            raise
+        logging.info(f"Script worker started with pid {hello['pid']}")
+        if self.capabilities:
+            self.request({'type': 'driver', 'capabilities': self.capabilities, 'server_url': self.server_url},
+                         timeout=timeout)
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, message, timeout=None):
+        """Send `message` and wait for its reply; a worker silent for `timeout` seconds is killed."""
+        timeout = self.job_timeout if timeout is None else timeout
+        self.job_id += 1
+        message['id'] = self.job_id
+        self.connection.send(message)
+        deadline = time.time() + timeout
+        while True:
+            if not self.connection.poll(max(0.0, deadline - time.time())):
+                self.kill()
+                raise TimeoutError(f"Script worker did not answer within {timeout} seconds")
+            reply = self.connection.recv()
+            if reply['type'] in ('ok', 'done') and reply['id'] == message['id']:
+                return reply
+            if reply['type'] == 'result':
+                result = reply['result']
+                logging.info(f"{result['function']} finished in {result['duration']:.1f}s, ok={result['ok']}")
+
+    def run(self, scripts, vin=None, context=None):
+        """Run `scripts` in order for one VIN; returns one result dict per script."""
+        with self.lock:
+            try:
+                if not self.is_alive():
+                    self.start()
+            except (EOFError, OSError):
+                logging.exception("Script worker unavailable, running scripts in their own interpreter")
+                return self.run_cold(scripts, vin, context)
+            try:
+                return self.request({'type': 'run', 'scripts': [str(s) for s in scripts], 'vin': vin,
+                                     'context': context})['results']
+            except TimeoutError:
+                logging.exception("Script worker hung and was killed, it will be restarted for the next job")
+                error = "worker timed out"
+            except (EOFError, OSError):
+                logging.exception("Script worker died, it will be restarted for the next job")
+                error = "worker died"
+            self.kill()
+            return [{'function': Path(s).stem, 'script': str(s), 'ok': False, 'vin': vin,
+                     'error': error, 'duration': 0.0} for s in scripts]
+
+    def run_cold(self, scripts, vin=None, context=None):
+        env = dict(self.env, **{JOB_CONTEXT_ENV: json.dumps(context or {})})
+        results = []
+        for script in scripts:
+            start_time = time.time()
+            completed = subprocess.run([self.python, str(script)], env=env)
+            results.append({'function': Path(script).stem, 'script': str(script), 'ok': completed.returncode == 0,
+                            'vin': vin, 'duration': time.time() - start_time,
+                            'error': None if completed.returncode == 0 else f"exit code {completed.returncode}"})
+        return results
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.send({'type': 'stop'})
+            except (OSError, ValueError):
+                pass
+            self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def kill(self):
+        """Drop a worker that cannot be talked to any more, without waiting for it to stop."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        self.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connect", required=True, help="HOST:PORT of the orchestrator")
+    args = parser.parse_args()
+    host, port = args.connect.rsplit(':', 1)
+    serve((host, int(port)), bytes.fromhex(os.environ[AUTHKEY_ENV]))
+
+
+if __name__ == "__main__":
+    # Run through the importable module so scripts see the same shared_driver() state.
+    import vin_worker
+    vin_worker.main()
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class WaitEngine:
+    """Waits on explicit conditions instead of fixed sleeps and learns how long each step takes.
+
+    `until(step, condition, make=...)` polls `condition()` until it returns something truthy and
+    returns that value, or None once the deadline passes. Exceptions raised by the condition
+    (element not found yet, stale element, ...) count as "not ready". Every wait is recorded per
+    make and step, one that ran out as a censored sample at the caller's timeout, so a step that
+    got slower raises its estimate again. Once enough samples exist the deadline becomes the
+    learned p95 times `margin`, kept between `min_fraction` of the caller's timeout and the
+    timeout itself, and the polling interval a tenth of the median, so fast steps are polled
+    tightly and slow ones are not hammered. The samples are kept in `stats_path` so later runs
+    start from what earlier runs measured.
+    """
+
+    def __init__(self, stats_path=None, max_samples=200, min_samples=5, margin=1.5,
+                 min_timeout=1.0, min_fraction=0.25, min_interval=0.05, max_interval=1.0):
+        self.stats_path = Path(stats_path) if stats_path else None
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.margin = margin
+        self.min_timeout = min_timeout
+        self.min_fraction = min_fraction
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def key(step, make=None):
+        return f"{make}/{step}" if make else step
+
+    def load(self):
+        if not self.stats_path or not self.stats_path.exists():
+            return
+        try:
+            with open(self.stats_path, 'r') as json_file:
+                stored = json.load(json_file)
+        except (OSError, ValueError):
+            logging.exception(f"Could not read wait statistics from {self.stats_path}")
+            return
+        self.samples = {key: deque(values, maxlen=self.max_samples) for key, values in stored.items()}
+
+    def save(self):
+        if not self.stats_path or not self.dirty:
+            return
+        with self.lock:
+            stored = {key: list(values) for key, values in self.samples.items()}
+            self.dirty = False
+        try:
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.stats_path.with_suffix('.tmp')
+            with open(temp_path, 'w') as json_file:
+                json.dump(stored, json_file)
+            os.replace(temp_path, self.stats_path)
+        except OSError:
+            logging.exception(f"Could not save wait statistics to {self.stats_path}")
+
+    def record(self, step, make, elapsed):
+        with self.lock:
+            for key in {self.key(step), self.key(step, make)}:
+                self.samples.setdefault(key, deque(maxlen=self.max_samples)).append(round(elapsed, 3))
+            self.dirty = True
+
+    def history(self, step, make=None):
+        """Samples for this make and step, or for the step over all makes while the make is new."""
+        with self.lock:
+            samples = self.samples.get(self.key(step, make)) or ()
+            if len(samples) < self.min_samples:
+                samples = self.samples.get(self.key(step)) or ()
+            return list(samples) if len(samples) >= self.min_samples else []
+
+    def deadline(self, step, make=None, timeout=30):
+        samples = self.history(step, make)
+        if not samples:
+            return timeout
+        learned = percentile(samples, 95) * self.margin
+        return min(timeout, max(self.min_timeout, timeout * self.min_fraction, learned))
+
+    def interval(self, step, make=None):
+        samples = self.history(step, make)
+        if not samples:
+            return self.max_interval / 2
+        return min(self.max_interval, max(self.min_interval, percentile(samples, 50) / 10))
+
+    def until(self, step, condition, make=None, timeout=30, should_stop=None, learn=True):
+        deadline = self.deadline(step, make, timeout)
+        interval = self.interval(step, make)
+        start_time = time.monotonic()
+        while True:
+            try:
+                value = condition()
+            except Exception:
+                value = None
+            elapsed = time.monotonic() - start_time
+            if value:
+                if learn:
+                    self.record(step, make, elapsed)
+                return value
+            if should_stop and should_stop():
+                logging.info(f"Wait '{self.key(step, make)}' stopped after {elapsed:.1f}s")
+                return None
+            if elapsed >= deadline:
+                logging.info(f"Wait '{self.key(step, make)}' gave up after {elapsed:.1f}s")
+                if learn:
+                    # Censored: it took at least this long, and the deadline must be able to grow back.
+                    self.record(step, make, timeout)
+                return None
+            time.sleep(min(interval, max(0.0, deadline - elapsed)))
+
+    def report(self):
+        with self.lock:
+            steps = {key: list(values) for key, values in self.samples.items() if '/' not in key}
+        for step, samples in sorted(steps.items()):
+            logging.info(f"Wait '{step}': p50 {percentile(samples, 50):.2f}s, p95 {percentile(samples, 95):.2f}s "
+                         f"over {len(samples)} waits")
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """Parses every sheet of a test-document workbook once and serves it from a columnar on-disk copy.
+
+    Layout of one cached workbook:
+        <cache_dir>/<path key>/<content hash>/manifest.json
+        <cache_dir>/<path key>/<content hash>/s<N>/c<M>.bin      UTF-8 text of column M
+        <cache_dir>/<path key>/<content hash>/s<N>/offsets.npy   character offsets, one row per column
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, cache_dir, setting_path=None, database_dir=None, settings=None):
+        self.cache_dir = Path(cache_dir)
+        self.setting_path = setting_path
+        self.settings = settings
+        self.database_dir = database_dir
+        self.lock = threading.RLock()
+        self.document = None
+        self.workbooks = {}
+
+    def current_document(self):
+        """Resolve the test document from setting.json and drop cached views if it changed."""
+        if self.settings is not None:
+            settings = self.settings.snapshot()
+        else:
+            with open(self.setting_path, 'r') as json_file:
+                settings = json.load(json_file)
+        document = Path(self.database_dir) / settings['test_document']
+        if document != self.document:
+            if self.document is not None:
+                logging.info(f"Test document changed from {self.document.name} to {document.name}, "
+                             f"invalidating workbook cache.")
+            self.invalidate()
+            self.document = document
+        return document
+
+    def invalidate(self):
+        with self.lock:
+            self.workbooks.clear()
+
+    def sheet_names(self, path_file=None):
+        return list(self.load_workbook(path_file)['sheets'])
+
+    def read_sheet(self, sheet_name, usecols=None, path_file=None):
+        """Return a sheet as a DataFrame of strings, blank cells as ''."""
+        import pandas as pd
+        workbook = self.load_workbook(path_file)
+        sheet = workbook['sheets'].get(sheet_name)
+        if sheet is None:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        columns = sheet['columns'] if usecols is None else list(usecols)
+        missing = [column for column in columns if column not in sheet['columns']]
+        if missing:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+        data = {column: self.read_column(workbook, sheet, column) for column in columns}
+        return pd.DataFrame(data, columns=columns)
+
+    def read_records(self, sheet_name, usecols=None, path_file=None):
+        return self.read_sheet(sheet_name, usecols, path_file).to_dict('records')
+
+    def matching_rows(self, sheet_name, column, values, path_file=None):
+        """The header row, then every row whose `column` is one of `values`, all columns as strings."""
+        workbook = self.load_workbook(path_file)
+        sheet = workbook['sheets'].get(sheet_name)
+        if sheet is None:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        if column not in sheet['columns']:
+            raise ValueError(f"Column '{column}' not found in worksheet '{sheet_name}'")
+        values = set(values)
+        indexes = [index for index, value in enumerate(self.read_column(workbook, sheet, column)) if value in values]
+        columns = [self.read_column(workbook, sheet, name) for name in sheet['columns']]
+        return [list(sheet['columns'])] + [[column_values[index] for column_values in columns] for index in indexes]
+
+    def load_workbook(self, path_file=None):
+        path_file = Path(path_file) if path_file else self.current_document()
+        key = str(path_file.resolve())
+        with self.lock:
+            stat = path_file.stat()
+            workbook = self.workbooks.get(key)
+            if workbook and workbook['mtime'] == stat.st_mtime and workbook['size'] == stat.st_size:
+                return workbook
+            workbook = self.open_cached(path_file, stat)
+            self.workbooks[key] = workbook
+            return workbook
+
+    def entry_dir(self, path_file):
+        return self.cache_dir / hashlib.sha1(str(path_file.resolve()).lower().encode('utf-8')).hexdigest()[:16]
+
+    def open_cached(self, path_file, stat):
+        entry_dir = self.entry_dir(path_file)
+        manifest = self.find_manifest(entry_dir, stat)
+        if manifest is None:
+            content_hash = file_sha1(path_file)
+            manifest_path = entry_dir / content_hash / self.manifest_name
+            if manifest_path.exists():
+                manifest = self.load_manifest(manifest_path)
+                manifest.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+                self.write_manifest(manifest_path, manifest)
+                logging.info(f"Workbook {path_file.name} touched but unchanged, reusing cache.")
+            else:
+                manifest = self.build(path_file, stat, entry_dir / content_hash, content_hash)
+            self.remove_stale(entry_dir, keep=content_hash)
+        manifest['dir'] = entry_dir / manifest['hash']
+        manifest['columns'] = {}
+        return manifest
+
+    def find_manifest(self, entry_dir, stat):
+        if not entry_dir.is_dir():
+            return None
+        for version_dir in entry_dir.iterdir():
+            manifest_path = version_dir / self.manifest_name
+            if not manifest_path.exists():
+                continue
+            manifest = self.load_manifest(manifest_path)
+            if manifest['mtime'] == stat.st_mtime and manifest['size'] == stat.st_size:
+                return manifest
+        return None
+
+    def load_manifest(self, manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as json_file:
+            return json.load(json_file)
+
+    def write_manifest(self, manifest_path, manifest):
+        tmp_path = manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as json_file:
+            json.dump(manifest, json_file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+    def build(self, path_file, stat, version_dir, content_hash):
+        import numpy as np
+        import pandas as pd
+        logging.info(f"Parsing workbook {path_file.name} into cache {version_dir}")
+        sheets = pd.read_excel(path_file, sheet_name=None, dtype=str, na_filter=False)
+        if version_dir.exists():
+            shutil.rmtree(version_dir, ignore_errors=True)
+        version_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'source': str(path_file), 'mtime': stat.st_mtime, 'size': stat.st_size,
+                    'hash': content_hash, 'sheets': {}}
+        for index, (sheet_name, df) in enumerate(sheets.items()):
+            sheet_dir = version_dir / f"s{index}"
+            sheet_dir.mkdir()
+            columns = [str(column) for column in df.columns]
+            offsets = np.zeros((len(columns), len(df) + 1), dtype=np.int64)
+            for column_index, column in enumerate(df.columns):
+                values = ['' if value is None else str(value) for value in df[column].tolist()]
+                np.cumsum([len(value) for value in values], out=offsets[column_index, 1:])
+                with open(sheet_dir / f"c{column_index}.bin", 'wb') as file:
+                    file.write(''.join(values).encode('utf-8'))
+            np.save(sheet_dir / "offsets.npy", offsets)
+            manifest['sheets'][sheet_name] = {'dir': sheet_dir.name, 'columns': columns, 'rows': len(df)}
+        # The manifest is written last so a crash mid-build never leaves a usable but partial entry.
+        self.write_manifest(version_dir / self.manifest_name, manifest)
+        logging.info(f"Cached {len(sheets)} sheets of {path_file.name}")
+        return manifest
+
+    def remove_stale(self, entry_dir, keep):
+        for version_dir in entry_dir.iterdir():
+            if version_dir.name != keep:
+                # On Windows a file still open elsewhere cannot be deleted; it will be retried on the next build.
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    def read_column(self, workbook, sheet, column):
+        """A column's values, read and split once per workbook version, then served from memory."""
+        import numpy as np
+        key = (sheet['dir'], column)
+        with self.lock:
+            values = workbook['columns'].get(key)
+            if values is None:
+                sheet_dir = workbook['dir'] / sheet['dir']
+                column_index = sheet['columns'].index(column)
+                offsets = np.load(sheet_dir / "offsets.npy")[column_index].tolist()
+                text = (sheet_dir / f"c{column_index}.bin").read_bytes().decode('utf-8')
+                values = [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+                workbook['columns'][key] = values
+            return values